@@ -1,19 +1,25 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import datetime as dt
-import joblib
-import mlflow
-import dagshub
 import os
 from pathlib import Path
-from sklearn.pipeline import Pipeline
-from time import sleep
-import folium
-from streamlit_folium import folium_static
+from src.features.region_grid import build_region_grid, load_region_grid, lookup_regions
+from src.features.feature_store import features_path, load_features, stored_path
+from src.features.slot_table import build_slot_table, slot_rows
+from src.models.compiled_model import compile_model, load_compiled_model, predict_compiled
+from src.models.forecast_cache import load_forecast_cache, cached_forecasts
+from src.models.recursive_forecast import load_demand_state, forecast_from_state
+from src.serving.artifacts import ArtifactCache
+from src.features.region_polygons import load_region_polygons
+from src.visualization.region_map import (region_colors, region_layer, region_centres,
+                                          polygon_layer, polygon_centres, region_name, build_map)
 
 # Page config
 st.set_page_config(page_title="Uber Demand Prediction", page_icon="🌆")
 
+# # the MLflow block below needs `import mlflow` and `import dagshub` when it
+# # is enabled again, they are not imported while it is commented out
 # # Inject DAGSHUB_TOKEN for MLflow authorization
 # os.environ["DAGSHUB_TOKEN"] = st.secrets["DAGSHUB"]["TOKEN"]
 
@@ -53,18 +59,71 @@ def download_from_drive(file_id, filename):
     return filename
 
 # Download models/data from Google Drive
-scaler_path = download_from_drive(SCALER_KEY, "scaler.joblib")
-encoder_path = download_from_drive(ENCODER_KEY, "encoder.joblib")
-model_path = download_from_drive(MODEL_KEY, "model.joblib")
 plot_data_path = download_from_drive(PLOT_DATA, "plot_data.csv")
-test_data_path = download_from_drive(TEST_CSV, "test.csv")
-
-# Load assets
-scaler = joblib.load(scaler_path)
-encoder = joblib.load(encoder_path)
-model = joblib.load(model_path)
-df_plot = pd.read_csv(plot_data_path)
-df = pd.read_csv(test_data_path, parse_dates=["tpep_pickup_datetime"]).set_index("tpep_pickup_datetime")
+# the test features of the dvc pipeline are used when they are on disk
+test_data_path = stored_path(features_path(".", "test"))
+if not test_data_path.exists():
+    test_data_path = download_from_drive(TEST_CSV, "test.csv")
+
+# One artifact cache per process, shared by all sessions and reruns
+@st.cache_resource
+def get_artifact_cache():
+    return ArtifactCache()
+
+def load_joblib(path):
+    import joblib
+    return joblib.load(path)
+
+def get_compiled_model(artifacts):
+    # the compiled model of the dvc pipeline, or compiled from the models
+    # on Google Drive when models/ was not pulled
+    if Path("models/compiled_model.npz").exists():
+        return artifacts.get("compiled_model", "models/compiled_model.npz", load_compiled_model)
+    encoder_path = download_from_drive(ENCODER_KEY, "encoder.joblib")
+    model_path = download_from_drive(MODEL_KEY, "model.joblib")
+    return artifacts.get("compiled_model", model_path,
+                         lambda path: compile_model(load_joblib(encoder_path), load_joblib(path)))
+
+def get_region_grid(artifacts):
+    # the region grid of the dvc pipeline, or built from the scaler and
+    # kmeans on Google Drive
+    if Path("models/region_grid.npz").exists():
+        return artifacts.get("region_grid", "models/region_grid.npz", load_region_grid)
+    scaler_path = download_from_drive(SCALER_KEY, "scaler.joblib")
+    kmeans_path = download_from_drive(KMEANS_KEY, "mb_kmeans.joblib")
+    return artifacts.get("region_grid", kmeans_path,
+                         lambda path: build_region_grid(load_joblib(scaler_path), load_joblib(path)))
+
+# Load assets, each file is read again only when it changed on disk
+artifacts = get_artifact_cache()
+compiled_model = get_compiled_model(artifacts)
+forecast_cache = artifacts.get("forecast_cache", "models/forecast_cache.npz", load_forecast_cache, optional=True)
+demand_state = artifacts.get("demand_state", "models/demand_state.npz", load_demand_state, optional=True)
+region_grid = get_region_grid(artifacts)
+df_plot = artifacts.get("plot_data", plot_data_path, pd.read_csv)
+slot_table = artifacts.get("slot_table", test_data_path, lambda path: build_slot_table(load_features(path)))
+
+def load_region_map(path):
+    # the static map layer of the plot data
+    df_plot = pd.read_csv(path)
+    colors = region_colors(df_plot["region"])
+    return {"colors": colors,
+            "layer": region_layer(df_plot, colors),
+            "centres": region_centres(df_plot)}
+
+def load_polygon_map(path):
+    # the static map layer of the region polygons
+    region_polygons = load_region_polygons(path)
+    regions = pd.Series([feature["properties"]["region"] for feature in region_polygons["features"]])
+    colors = region_colors(regions.sort_values())
+    return {"colors": colors,
+            "layer": polygon_layer(region_polygons, colors),
+            "centres": polygon_centres(region_polygons)}
+
+# the 30 region polygons replace the sampled points when they are built
+region_map = artifacts.get("polygon_map", "models/region_polygons.geojson", load_polygon_map, optional=True)
+if region_map is None:
+    region_map = artifacts.get("region_map", plot_data_path, load_region_map)
 
 # UI
 st.title("Uber Demand in New York City 🚕🌆")
@@ -73,6 +132,11 @@ st.sidebar.title("Options")
 map_type = st.sidebar.radio(label="Select the type of Map",
                             options=["Complete NYC Map"],
                             index=0)
+horizon = st.sidebar.slider("Forecast horizon (hours)", min_value=1, max_value=8, value=2)
+
+with st.sidebar.expander("Artifact load times"):
+    for name, timing in artifacts.timings.items():
+        st.write(f"{name}: {timing['seconds'] * 1000:.1f} ms ({timing['loads']} loads)")
 
 # Date selection
 st.subheader("Date")
@@ -100,137 +164,80 @@ if date and time:
     sample_loc = df_plot.sample(1).reset_index(drop=True)
     lat = sample_loc["pickup_latitude"].item()
     long = sample_loc["pickup_longitude"].item()
-    region = sample_loc["region"].item()
 
     st.write("**Your Current Location**")
     st.write(f"Lat: {lat}")
     st.write(f"Long: {long}")
 
-    with st.spinner("Fetching your Current Region"):
-        sleep(3)
+    # Look up the region in the precomputed grid
+    region = lookup_regions(region_grid, sample_loc[["pickup_longitude", "pickup_latitude"]].to_numpy()).item()
     st.write("Region ID: ", region)
 
-    # Apply scaler
-    scaled_cord = scaler.transform(sample_loc.iloc[:, 0:2])
-
-    # Create color mapping
-    colors = ["#FF0000", "#FF4500", "#FF8C00", "#FFD700", "#ADFF2F", 
-              "#32CD32", "#008000", "#006400", "#00FF00", "#7CFC00", 
-              "#00FA9A", "#00FFFF", "#40E0D0", "#4682B4", "#1E90FF", 
-              "#0000FF", "#0000CD", "#8A2BE2", "#9932CC", "#BA55D3", 
-              "#FF00FF", "#FF1493", "#C71585", "#FF6347", "#FFA07A", 
-              "#FFDAB9", "#FFE4B5", "#F5DEB3", "#EEE8AA", "#FFB6C1"]
-
-    region_colors = {region: colors[i] for i, region in enumerate(df_plot["region"].unique())}
-    df_plot["color"] = df_plot["region"].map(region_colors)
-
-    # Prediction pipeline
-    pipe = Pipeline([
-        ('encoder', encoder),
-        ('reg', model)
-    ])
-
-    # Add region names mapping (based on NYC neighborhoods)
-    REGION_NAMES = {
-        0: "Upper West Side",
-        1: "Upper East Side",
-        2: "Midtown West",
-        3: "Midtown East",
-        4: "Chelsea",
-        5: "Gramercy",
-        6: "Greenwich Village",
-        7: "SoHo",
-        8: "Tribeca",
-        9: "Financial District",
-        10: "East Village",
-        11: "Lower East Side",
-        12: "East Harlem",
-        13: "Central Harlem",
-        14: "Morningside Heights",
-        15: "Hamilton Heights",
-        16: "Washington Heights",
-        17: "Inwood",
-        18: "Roosevelt Island",
-        19: "Battery Park",
-        20: "Chinatown",
-        21: "NoHo",
-        22: "Civic Center",
-        23: "Little Italy",
-        24: "Nolita",
-        25: "Two Bridges",
-        26: "Stuyvesant Town",
-        27: "Kips Bay",
-        28: "Murray Hill",
-        29: "Tudor City"
-    }
+    # Look the demand up in the forecast cache, the model is the
+    # fallback for slots outside of it
+    forecast = cached_forecasts(forecast_cache, index) if forecast_cache is not None else None
+    if forecast is None:
+        # the features of the slot, already ordered by region
+        rows = slot_rows(slot_table, index)
+        if rows is not None:
+            region_ids, features = rows
+            forecast = (region_ids, predict_compiled(compiled_model, features))
 
     # Show complete NYC map
     if map_type == "Complete NYC Map":
-        progress_bar = st.progress(value=0, text="Loading map...")
-        for i in range(100):
-            sleep(0.01)
-            progress_bar.progress(i + 1, text="Loading map...")
-
-        # Create a Folium map centered on NYC
-        m = folium.Map(location=[40.7831, -73.9712], zoom_start=12)
-
-        # Add all regions as circles
-        for _, row in df_plot.iterrows():
-            color = region_colors.get(row["region"], "#000000")
-            folium.CircleMarker(
-                location=[row["pickup_latitude"], row["pickup_longitude"]],
-                radius=3,
-                color=color,
-                fill=True,
-                popup=f"Region: {REGION_NAMES.get(row['region'], f'Region {row['region']}')}",
-            ).add_to(m)
-
-        # Add current location with a special marker
-        if 'lat' in locals() and 'long' in locals():
-            folium.Marker(
-                location=[lat, long],
-                popup=f"Your Location<br>Region: {REGION_NAMES.get(region, f'Region {region}')}",
-                icon=folium.Icon(color='red', icon='info-sign')
-            ).add_to(m)
+        # the region layer is built once, only the demand and the location
+        # are added per request
+        m = build_map(region_map["layer"], region_map["colors"],
+                      centres=region_map["centres"],
+                      forecast=forecast,
+                      location=[lat, long],
+                      region=region)
 
         # Display the map
+        from streamlit_folium import folium_static
         folium_static(m)
-        progress_bar.empty()
 
-        # Predict demand
-        if index in df.index:
-            input_data = df.loc[index, :].sort_values("region")
-            target = input_data["total_pickups"]
-            predictions = pipe.predict(input_data.drop(columns=["total_pickups"]))
+        if forecast is not None:
+            region_ids, predictions = forecast
 
             # Enhanced Map Legend with Region Names
             st.markdown("### Region Information")
             
             # Current Region Highlight
-            if 'region' in locals():
-                st.markdown(f"""
-                #### 📍 Your Current Location
-                - **Region Name:** {REGION_NAMES.get(region, f'Region {region}')}
-                - **Region ID:** {region}
-                - **Coordinates:** ({lat:.4f}, {long:.4f})
-                """)
-                st.markdown("---")
+            st.markdown(f"""
+            #### 📍 Your Current Location
+            - **Region Name:** {region_name(region)}
+            - **Region ID:** {region}
+            - **Coordinates:** ({lat:.4f}, {long:.4f})
+            """)
+            st.markdown("---")
 
             st.markdown("### All Regions")
-            for i in range(len(predictions)):
-                region_id = input_data.iloc[i]["region"]
-                demand = int(predictions[i])
-                color = region_colors.get(region_id, "#000000")
-                region_name = REGION_NAMES.get(region_id, f"Region {region_id}")
+            for region_id, prediction in zip(region_ids, predictions):
+                region_id = int(region_id)
+                demand = int(prediction)
+                color = region_map["colors"].get(region_id, "#000000")
                 is_current = region == region_id
                 
                 st.markdown(
                     f'<div style="display: flex; align-items: center; margin-bottom: 10px;">'
                     f'<div style="background-color:{color}; width: 20px; height: 20px; margin-right: 10px; border-radius: 50%;"></div>'
-                    f'<div><strong>{region_name}</strong> {" (Current Location)" if is_current else ""}<br>'
+                    f'<div><strong>{region_name(region_id)}</strong> {" (Current Location)" if is_current else ""}<br>'
                     f'Region ID: {region_id}<br>'
                     f'Predicted Demand: {demand}</div></div>',
                     unsafe_allow_html=True
                 )
         else:
-            st.warning("No data for the selected date & time.")
\ No newline at end of file
+            st.warning("No data for the selected date & time.")
+
+    # Roll the model forward from the slot before the selected one
+    if demand_state is not None:
+        steps = horizon * 4
+        origin = (index - pd.Timedelta("15min")).to_datetime64()
+        horizon_forecast = forecast_from_state(compiled_model, demand_state, [origin], steps)[0]
+        if not pd.isna(horizon_forecast[region]).all():
+            st.markdown(f"### Demand for the next {horizon} hours")
+            times = pd.date_range(index, periods=steps, freq="15min")
+            st.line_chart(pd.DataFrame({region_name(region): horizon_forecast[region],
+                                        "All regions": np.nansum(horizon_forecast, axis=0)},
+                                       index=times))
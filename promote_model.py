@@ -1,13 +1,7 @@
-import mlflow
-import dagshub
 import json
-from mlflow import MlflowClient
+from src.models.tracking import init_tracking
 
-import dagshub
-dagshub.init(repo_owner='MohammoD2', repo_name='Uber_Demand_Pridiction-', mlflow=True)
-
-# set the mlflow tracking uri
-mlflow.set_tracking_uri("https://dagshub.com/MohammoD2/Uber_Demand_Pridiction-.mlflow")
+mlflow = init_tracking()
 
 
 def load_model_information(file_path):
@@ -22,7 +16,7 @@ registered_model_name = 'uber_demand_prediction_model'
 stage = "Staging"
 
 # get the latest version from staging stage
-client = MlflowClient()
+client = mlflow.MlflowClient()
 
 # get the latest version of model in staging
 latest_versions = client.get_latest_versions(name=registered_model_name,stages=[stage])
@@ -1,6 +1,12 @@
+import os
+import json
+import dask
 import dask.dataframe as dd
+import numpy as np
 import logging
+import shutil
 from pathlib import Path
+from yaml import safe_load
 
 # create a logger
 logger = logging.getLogger("data_ingestion")
@@ -27,6 +33,40 @@ max_fare_amount_val = 81.0
 min_trip_distance_val = 0.25
 max_trip_distance_val = 24.43
 
+# raw monthly files of the pipeline
+raw_file_names = ["yellow_tripdata_2016-01.csv",
+                  "yellow_tripdata_2016-02.csv",
+                  "yellow_tripdata_2016-03.csv"]
+
+# compact dtypes for the parquet copy of the raw data
+parquet_dtypes = {'trip_distance': 'float32',
+                  'pickup_longitude': 'float32',
+                  'pickup_latitude': 'float32',
+                  'dropoff_longitude': 'float32',
+                  'dropoff_latitude': 'float32',
+                  'fare_amount': 'float32'}
+
+# bounds filter expressed as row group predicates. the bounds are rounded
+# to float32 like the stored columns, so a value on a bound is kept as it
+# is by remove_outliers
+parquet_filters = [(column, op, float(np.float32(bound)))
+                   for column, op, bound in
+                   [('pickup_latitude', '>=', min_latitude),
+                    ('pickup_latitude', '<=', max_latitude),
+                    ('pickup_longitude', '>=', min_longitude),
+                    ('pickup_longitude', '<=', max_longitude),
+                    ('dropoff_latitude', '>=', min_latitude),
+                    ('dropoff_latitude', '<=', max_latitude),
+                    ('dropoff_longitude', '>=', min_longitude),
+                    ('dropoff_longitude', '<=', max_longitude),
+                    ('fare_amount', '>=', min_fare_amount_val),
+                    ('fare_amount', '<=', max_fare_amount_val),
+                    ('trip_distance', '>=', min_trip_distance_val),
+                    ('trip_distance', '<=', max_trip_distance_val)]]
+
+# size and mtime of the source csv, stored inside the parquet copy
+source_stamp_name = "_source.json"
+
 
 def read_dask_df(data_path: Path, parse_dates: list=["tpep_pickup_datetime"],
                  columns: list=['trip_distance', 
@@ -35,12 +75,115 @@ def read_dask_df(data_path: Path, parse_dates: list=["tpep_pickup_datetime"],
                                 'pickup_latitude',
                                 'dropoff_longitude', 
                                 'dropoff_latitude', 
-                                'fare_amount']):
-    dd_df = dd.read_csv(data_path, parse_dates=parse_dates, usecols=columns)
+                                'fare_amount'],
+                 blocksize="64MB"):
+    dd_df = dd.read_csv(data_path, parse_dates=parse_dates, usecols=columns,
+                        blocksize=blocksize)
     return dd_df
 
 
-def dask_pipeline(df):
+def source_stamp(csv_path: Path):
+    stat = csv_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def convert_to_parquet(csv_path: Path, parquet_path: Path, blocksize="64MB"):
+    # the raw csv is parsed only once, later runs reuse the parquet copy
+    # as long as the csv it was converted from is unchanged
+    stamp = source_stamp(csv_path)
+    stamp_path = parquet_path / source_stamp_name
+    if stamp_path.exists():
+        with open(stamp_path, "r") as f:
+            if json.load(f) == stamp:
+                logger.info(f"Parquet data found at {parquet_path.name}, "
+                            "skipping conversion")
+                return parquet_path
+
+    # the parts are written to a temporary directory that is moved into
+    # place with its stamp only after the conversion succeeded, a directory
+    # left by an interrupted run is never reused
+    tmp_path = parquet_path.with_name(parquet_path.name + ".tmp")
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    dd_df = read_dask_df(csv_path, blocksize=blocksize)
+    dd_df = dd_df.astype(parquet_dtypes)
+    dd_df.to_parquet(tmp_path, write_index=False)
+    with open(tmp_path / source_stamp_name, "w") as f:
+        json.dump(stamp, f)
+    if parquet_path.exists():
+        shutil.rmtree(parquet_path)
+    os.replace(tmp_path, parquet_path)
+    logger.info(f"{csv_path.name} converted to parquet successfully")
+    return parquet_path
+
+
+def read_parquet_df(data_path, columns: list=['tpep_pickup_datetime',
+                                              'pickup_longitude',
+                                              'pickup_latitude'],
+                    filters: list=parquet_filters):
+    # only the output columns are loaded, the bounds filter is pushed down
+    # to the row groups and applied row wise by the pyarrow reader
+    dd_df = dd.read_parquet(data_path, columns=columns, filters=filters)
+    return dd_df
+
+
+def save_parquet_df(df, save_path: Path):
+    # every partition is written by its own task, nothing is gathered
+    df.to_parquet(save_path, write_index=False, overwrite=True)
+    logger.info("DataFrame partitions saved successfully")
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+def write_partition(df, save_path: Path, file_format="csv"):
+    if file_format == "parquet":
+        df.to_parquet(save_path, index=False)
+    else:
+        df.to_csv(save_path, index=False)
+    return len(df)
+
+
+def written_partition(df, save_path: Path, file_format="csv"):
+    write_partition(df, save_path, file_format)
+    return df
+
+
+def streamed_partitions(df, save_dir: Path, file_format="csv",
+                        max_in_flight=4):
+    # start from an empty directory so stale parts are never read downstream
+    if save_dir.exists():
+        shutil.rmtree(save_dir)
+    save_dir.mkdir(parents=True)
+
+    # compute and write the partitions in parallel windows, only
+    # max_in_flight of them are held in memory at any time. the written
+    # partitions are handed to the caller for use in the same pass
+    partitions = df.to_delayed()
+    for start in range(0, len(partitions), max_in_flight):
+        window = partitions[start:start + max_in_flight]
+        paths = [save_dir / f"part.{start + ind:05d}.{file_format}"
+                 for ind in range(len(window))]
+        writes = [dask.delayed(written_partition)(partition, path,
+                                                  file_format)
+                  for partition, path in zip(window, paths)]
+        chunks = dask.compute(*writes)
+        logger.info(f"Partitions {start + len(window)}/{len(partitions)} "
+                    "written")
+        yield from chunks
+
+
+def stream_partitions(df, save_dir: Path, file_format="csv",
+                      max_in_flight=4):
+    return sum(len(chunk) for chunk in
+               streamed_partitions(df, save_dir, file_format=file_format,
+                                   max_in_flight=max_in_flight))
+
+
+def remove_outliers(df):
     # select data points within the given ranges
     # remove outliers from lat long columns
     df = df.loc[(df["pickup_latitude"].between(min_latitude, max_latitude, inclusive="both")) & 
@@ -58,12 +201,41 @@ def dask_pipeline(df):
     cols_to_drop = ['trip_distance', 'dropoff_longitude', 'dropoff_latitude', 'fare_amount']
     df = df.drop(cols_to_drop, axis=1)
     logger.info("Columns are dropped successfully")
-    
-    # compute the df
-    df = df.compute()
-    logger.info("Dask DataFrame is computed successfully")
     return df
 
+
+def read_raw_data(raw_paths, ingestion_params):
+    # lazy frame of the raw files with the outliers removed
+    blocksize = ingestion_params["streaming"]["blocksize"]
+    if ingestion_params["file_format"] == "parquet":
+        # convert the raw csv files to parquet once
+        parquet_paths = []
+        for raw_path in raw_paths:
+            parquet_name = raw_path.name.replace(".csv", ".parquet")
+            parquet_path = raw_path.parent / "parquet" / parquet_name
+            parquet_paths.append(convert_to_parquet(raw_path, parquet_path,
+                                                    blocksize=blocksize))
+        logger.info("Raw data converted to parquet successfully")
+        
+        # read the parquet data with the bounds filter pushed down
+        dfs = [read_parquet_df(parquet_path) for parquet_path in parquet_paths]
+        df = dd.concat(dfs, axis=0)
+        logger.info("Outliers are removed successfully")
+        return df
+    
+    # read all dataframes
+    dfs = [read_dask_df(raw_path, blocksize=blocksize)
+           for raw_path in raw_paths]
+    logger.info("Dask DataFrames are read successfully")
+    
+    # concatenate all dfs
+    df = dd.concat(dfs, axis=0)
+    logger.info("All datasets merged successfully")
+    
+    # filter lazily, the partitions are computed when they are written
+    return remove_outliers(df)
+
+
 if __name__ == "__main__":
     # current path
     current_path = Path(__file__)
@@ -71,28 +243,36 @@ if __name__ == "__main__":
     root_path = current_path.parent.parent.parent
     # raw data path
     raw_data_dir = root_path / "data/raw"
-    # dataframe names
-    df_names = ["yellow_tripdata_2016-01.csv",
-                "yellow_tripdata_2016-02.csv",
-                "yellow_tripdata_2016-03.csv"]
-    # read all dataframes
-    dfs = []
-    # loop and read all dfs
-    for df_name in df_names:
-        df_path = raw_data_dir / df_name
-        df = read_dask_df(df_path)
-        dfs.append(df)
-    logger.info("Dask DataFrames are read successfully")
-    
-    # concatenate all dfs
-    df_final = dd.concat(dfs, axis=0)
-    logger.info("All datasets merged successfully")
+    # read the parameters for the stage
+    ingestion_params = read_params()["data_ingestion"]
+    file_format = ingestion_params["file_format"]
+    streaming_params = ingestion_params["streaming"]
     
-    # execute the dask pipeline
-    df_final = dask_pipeline(df_final)
-    logger.info("Dask pipeline is executed successfully")
+    # read the data without outliers
+    raw_paths = [raw_data_dir / df_name for df_name in raw_file_names]
+    df_final = read_raw_data(raw_paths, ingestion_params)
     
-    # save the dataframe
-    df_without_outliers_path = root_path / "data/interim/df_without_outliers.csv"
-    df_final.to_csv(df_without_outliers_path, index=False)
-    logger.info("DataFrame is saved successfully")
\ No newline at end of file
+    if streaming_params["enabled"]:
+        # stream the partitions to the interim directory
+        save_dir = root_path / "data/interim/df_without_outliers"
+        max_in_flight = streaming_params["max_in_flight"]
+        n_rows = stream_partitions(df_final, save_dir,
+                                   file_format=file_format,
+                                   max_in_flight=max_in_flight)
+        logger.info(f"DataFrame is streamed successfully with {n_rows} rows")
+    elif file_format == "parquet":
+        # save the dataframe partition wise
+        df_without_outliers_path = (root_path /
+                                    "data/interim/df_without_outliers.parquet")
+        save_parquet_df(df_final, df_without_outliers_path)
+        logger.info("DataFrame is saved successfully")
+    else:
+        # compute the df
+        df_final = df_final.compute()
+        logger.info("Dask DataFrame is computed successfully")
+        
+        # save the dataframe
+        df_without_outliers_path = (root_path /
+                                    "data/interim/df_without_outliers.csv")
+        df_final.to_csv(df_without_outliers_path, index=False)
+        logger.info("DataFrame is saved successfully")
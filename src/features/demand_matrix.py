@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+
+def slot_ids(pickup_times, base_time, freq="15min"):
+    # integer slot of every pickup counted from base_time
+    slot_ns = pd.Timedelta(freq).value
+    pickup_times = np.asarray(pickup_times, dtype="datetime64[ns]")
+    pickup_times = pickup_times.view(np.int64)
+    return (pickup_times - base_time.value) // slot_ns
+
+
+def time_bounds(pickup_times, freq="15min", chunksize=1000000):
+    # first and last slot start over the whole data, read chunk wise
+    min_time, max_time = None, None
+    for start in range(0, len(pickup_times), chunksize):
+        chunk = np.asarray(pickup_times[start:start + chunksize],
+                           dtype="datetime64[ns]")
+        if min_time is None:
+            min_time, max_time = chunk.min(), chunk.max()
+        else:
+            min_time = min(min_time, chunk.min())
+            max_time = max(max_time, chunk.max())
+    return (pd.Timestamp(min_time).floor(freq),
+            pd.Timestamp(max_time).floor(freq))
+
+
+def count_matrix(pickup_times, regions, n_regions, freq="15min",
+                 chunksize=1000000, base_time=None):
+    # dense (n_regions x n_slots) pickup counts accumulated chunk by chunk,
+    # pickups before an explicit base_time are left out
+    first_time, last_time = time_bounds(pickup_times, freq=freq,
+                                        chunksize=chunksize)
+    if base_time is None:
+        base_time = first_time
+    n_slots = max((last_time - base_time) // pd.Timedelta(freq) + 1, 0)
+    counts = np.zeros(n_regions * n_slots, dtype=np.int64)
+    for start in range(0, len(pickup_times), chunksize):
+        slots = slot_ids(pickup_times[start:start + chunksize], base_time,
+                         freq=freq)
+        chunk_regions = np.asarray(regions[start:start + chunksize],
+                                   dtype=np.int64)
+        cells = chunk_regions * n_slots + slots
+        counts += np.bincount(cells[slots >= 0], minlength=n_regions * n_slots)
+    return counts.reshape(n_regions, n_slots), base_time
+
+
+def region_spans(counts):
+    # first and last observed slot of every region, -1 for empty regions
+    observed = counts > 0
+    has_data = observed.any(axis=1)
+    first = np.where(has_data, observed.argmax(axis=1), -1)
+    last = np.where(has_data,
+                    counts.shape[1] - 1 - observed[:, ::-1].argmax(axis=1),
+                    -1)
+    return first, last
+
+
+def ewma_matrix(values, start, stop, alpha, weighted=None, old_wt=None):
+    # adjusted EWMA along the slot axis for all regions at once, following
+    # the update order of pandas ewm().mean() so the results match exactly.
+    # a region is averaged from slot start to slot stop, continuing from
+    # weighted/old_wt when given and starting fresh where weighted is NaN
+    n_regions, n_slots = values.shape
+    values = values.astype(np.float64)
+    averages = np.full((n_regions, n_slots), np.nan)
+    if weighted is None:
+        weighted = np.full(n_regions, np.nan)
+    if old_wt is None:
+        old_wt = np.ones(n_regions)
+    weighted = np.array(weighted, dtype=np.float64)
+    old_wt = np.array(old_wt, dtype=np.float64)
+    for slot in range(n_slots):
+        current = values[:, slot]
+        decayed_wt = old_wt * (1 - alpha)
+        updated = np.where(
+            weighted != current,
+            (decayed_wt * weighted + current) / (decayed_wt + 1),
+            weighted)
+        fresh = np.isnan(weighted)
+        active = (slot >= start) & (slot <= stop)
+        weighted = np.where(active, np.where(fresh, current, updated),
+                            weighted)
+        old_wt = np.where(active, np.where(fresh, 1.0, decayed_wt + 1),
+                          old_wt)
+        averages[:, slot] = weighted
+    return averages, weighted, old_wt
+
+
+def demand_frame(counts, base_time, start, stop, alpha, epsilon_val=10,
+                 freq="15min", weighted=None, old_wt=None,
+                 recent_pickups=None, history=4):
+    # long format table of the slots from start to stop of every region
+    # together with the checkpoint to continue from the last slots
+    n_regions, n_slots = counts.shape
+    slots = np.arange(n_slots)
+    in_span = (slots >= start[:, np.newaxis]) & (slots <= stop[:, np.newaxis])
+
+    # replace the empty slots inside a region span
+    total_pickups = np.where(counts == 0, epsilon_val, counts)
+    averages, weighted, old_wt = ewma_matrix(total_pickups, start, stop, alpha,
+                                             weighted=weighted, old_wt=old_wt)
+
+    # flatten region by region to the long format
+    region_ids, region_slots = np.nonzero(in_span)
+    slot_ns = pd.Timedelta(freq).value
+    index = pd.DatetimeIndex(base_time.value + region_slots * slot_ns,
+                             name="tpep_pickup_datetime")
+    resampled_data = pd.DataFrame({"region": region_ids,
+                                   "total_pickups": total_pickups[in_span],
+                                   "avg_pickups": averages[in_span].round()},
+                                  index=index)
+
+    # keep the last slot, the EWMA state and the trailing pickups of every
+    # region, regions without new slots keep their previous values
+    if recent_pickups is None:
+        recent_pickups = np.full((n_regions, history), np.nan)
+    has_slots = in_span.any(axis=1)
+    last_time = np.where(has_slots, base_time.value + stop * slot_ns,
+                         np.iinfo(np.int64).min).astype("datetime64[ns]")
+    trailing_pickups = recent_pickups.astype(np.float64)
+    for region in np.flatnonzero(has_slots):
+        span = total_pickups[region, start[region]:stop[region] + 1]
+        trailing_pickups[region] = np.concatenate([recent_pickups[region],
+                                                   span])[-history:]
+    checkpoint = {"last_time": last_time,
+                  "weighted": weighted,
+                  "old_wt": old_wt,
+                  "recent_pickups": trailing_pickups,
+                  "alpha": np.float64(alpha)}
+    return resampled_data, checkpoint
+
+
+def resample_demand(pickup_times, regions, n_regions, alpha, epsilon_val=10,
+                    freq="15min", history=4):
+    # same table as groupby("region").resample(freq).count() followed by
+    # the epsilon replacement and the rounded per region EWMA
+    counts, base_time = count_matrix(pickup_times, regions, n_regions,
+                                     freq=freq)
+    first, last = region_spans(counts)
+    return demand_frame(counts, base_time, first, last, alpha,
+                        epsilon_val=epsilon_val, freq=freq, history=history)
+
+
+def append_demand(pickup_times, regions, checkpoint, epsilon_val=10,
+                  freq="15min"):
+    # continue the table of resample_demand with newly arrived pickups, the
+    # result is the tail a full rebuild over all pickups would produce
+    if len(pickup_times) == 0:
+        # an empty increment has no time bounds, nothing is appended
+        raise ValueError("The new data has no pickups left after the "
+                         "outlier filter, nothing to append")
+    last_time = checkpoint["last_time"]
+    n_regions = len(last_time)
+    has_history = ~np.isnat(last_time)
+    first_time, _ = time_bounds(pickup_times, freq=freq)
+    if has_history.any():
+        next_time = (pd.Timestamp(last_time[has_history].min()) +
+                     pd.Timedelta(freq))
+        base_time = min(first_time, next_time)
+    else:
+        base_time = first_time
+    counts, base_time = count_matrix(pickup_times, regions, n_regions,
+                                     freq=freq, base_time=base_time)
+
+    # slots already in the table are not counted again
+    offsets = last_time.view(np.int64) - base_time.value
+    last_slot = np.where(has_history, offsets // pd.Timedelta(freq).value, -1)
+    counts[np.arange(counts.shape[1]) <= last_slot[:, np.newaxis]] = 0
+    first, last = region_spans(counts)
+
+    # regions with history continue right after their last slot
+    start = np.where(has_history & (last >= 0), last_slot + 1, first)
+    return demand_frame(counts, base_time, start, last, checkpoint["alpha"],
+                        epsilon_val=epsilon_val, freq=freq,
+                        weighted=checkpoint["weighted"],
+                        old_wt=checkpoint["old_wt"],
+                        recent_pickups=checkpoint["recent_pickups"],
+                        history=checkpoint["recent_pickups"].shape[1])
+
+
+def save_checkpoint(checkpoint, save_path):
+    np.savez(save_path, **checkpoint)
+
+
+def load_checkpoint(checkpoint_path):
+    with np.load(checkpoint_path) as checkpoint:
+        return {key: checkpoint[key] for key in checkpoint.files}
@@ -1,10 +1,17 @@
 import joblib
+import numpy as np
 import pandas as pd
 import logging
+import time
+import pyarrow.dataset as ds
 from pathlib import Path
 from yaml import safe_load
+from joblib import Parallel, delayed
 from sklearn.cluster import MiniBatchKMeans
 from sklearn.preprocessing import StandardScaler
+from src.features.region_grid import build_region_grid, lookup_regions
+from src.features.demand_matrix import resample_demand, save_checkpoint
+from src.features.lag_features import required_history
 
 
 # create a logger
@@ -21,11 +28,177 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 
 
+# coordinate columns in the order the scaler is fitted on
+cache_columns = ["pickup_longitude", "pickup_latitude"]
+
+
+def get_interim_path(root_path, ingestion_params):
+    # streamed output is a directory of part files in either format
+    if ingestion_params["streaming"]["enabled"]:
+        return root_path / "data/interim/df_without_outliers"
+    file_format = ingestion_params["file_format"]
+    return root_path / f"data/interim/df_without_outliers.{file_format}"
+
+
+def list_interim_parts(data_path):
+    data_path = Path(data_path)
+    if data_path.is_dir() and data_path.suffix != ".parquet":
+        return sorted(data_path.glob("part.*"))
+    return [data_path]
+
+
 def read_cluster_input(data_path, chunksize=100000, usecols=["pickup_latitude","pickup_longitude"]):
+    parts = list_interim_parts(data_path)
+    if len(parts) > 1:
+        return (chunk for part in parts
+                for chunk in read_cluster_input(part, chunksize=chunksize,
+                                                usecols=usecols))
+    data_path = parts[0]
+    if Path(data_path).suffix == ".parquet":
+        return read_parquet_chunks(data_path, chunksize=chunksize,
+                                   usecols=usecols)
     df_reader = pd.read_csv(data_path, chunksize=chunksize, usecols=usecols)
     return df_reader
 
 
+def read_parquet_chunks(data_path, chunksize=100000,
+                        usecols=["pickup_latitude", "pickup_longitude"]):
+    dataset = ds.dataset(data_path, format="parquet")
+    # keep the file order of the columns like read_csv does with usecols
+    columns = [name for name in dataset.schema.names if name in usecols]
+    for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def write_cluster_cache(chunks, cache_dir):
+    # single pass over the chunks, the coordinates are appended as float32
+    # and the pickup times as int64 nanoseconds
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    coordinates_path = cache_dir / "pickup_coordinates.bin"
+    times_path = cache_dir / "pickup_times.bin"
+    with open(coordinates_path, "wb") as coordinates_file, \
+         open(times_path, "wb") as times_file:
+        for chunk in chunks:
+            coordinates = chunk[cache_columns].to_numpy(dtype=np.float32)
+            coordinates.tofile(coordinates_file)
+            pickup_times = pd.to_datetime(chunk["tpep_pickup_datetime"])
+            pickup_times = pickup_times.to_numpy(dtype="datetime64[ns]")
+            pickup_times.view(np.int64).tofile(times_file)
+    return load_cluster_cache(cache_dir)
+
+
+def build_cluster_cache(data_path, cache_dir, chunksize=100000):
+    chunks = read_cluster_input(data_path, chunksize=chunksize,
+                                usecols=["tpep_pickup_datetime",
+                                         *cache_columns])
+    return write_cluster_cache(chunks, cache_dir)
+
+
+def load_cluster_cache(cache_dir):
+    coordinates = np.memmap(cache_dir / "pickup_coordinates.bin",
+                            dtype=np.float32, mode="r").reshape(-1, 2)
+    pickup_times = np.memmap(cache_dir / "pickup_times.bin",
+                             dtype="datetime64[ns]", mode="r")
+    return coordinates, pickup_times
+
+
+def iter_cache_chunks(coordinates, chunksize=100000):
+    for start in range(0, len(coordinates), chunksize):
+        # the chunk is upcast so the scaler and kmeans stay float64 models
+        yield pd.DataFrame(coordinates[start:start + chunksize],
+                           columns=cache_columns, dtype=np.float64)
+
+
+def predict_regions_chunk(cache_dir, start, stop, grid):
+    # each worker maps the cache itself, only the chunk bounds are sent
+    coordinates, _ = load_cluster_cache(cache_dir)
+    regions = np.memmap(cache_dir / "regions.bin", dtype=np.int16, mode="r+")
+    # look the regions up in the grid
+    regions[start:stop] = lookup_regions(grid, coordinates[start:stop])
+    regions.flush()
+    return stop - start
+
+
+def assign_regions(cache_dir, grid, chunksize=100000, n_jobs=-1):
+    coordinates, pickup_times = load_cluster_cache(cache_dir)
+    # preallocate the region output next to the cache
+    regions = np.memmap(cache_dir / "regions.bin", dtype=np.int16, mode="w+",
+                        shape=(len(coordinates),))
+    regions.flush()
+    
+    start_time = time.perf_counter()
+    n_rows = sum(Parallel(n_jobs=n_jobs)(
+        delayed(predict_regions_chunk)(
+            cache_dir, start, min(start + chunksize, len(coordinates)), grid)
+        for start in range(0, len(coordinates), chunksize)))
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Regions assigned for {n_rows} rows at "
+                f"{n_rows / max(elapsed, 1e-9):.0f} rows/sec")
+    
+    regions = np.memmap(cache_dir / "regions.bin", dtype=np.int16, mode="r")
+    return pickup_times, regions
+
+
+def fit_scaler(coordinates):
+    # train the standard scaler
+    scaler = StandardScaler()
+    # train for each chunk
+    for chunk in iter_cache_chunks(coordinates):
+        # fit the scaler
+        scaler.partial_fit(chunk)
+    return scaler
+
+
+def fit_kmeans(coordinates, scaler, mini_batch_params):
+    # train the kmeans model
+    mini_batch = MiniBatchKMeans(**mini_batch_params)
+    # train for each chunk
+    for chunk in iter_cache_chunks(coordinates):
+        # scale the chunk
+        scaled_chunk = scaler.transform(chunk)
+        # train the model
+        mini_batch.partial_fit(scaled_chunk)
+    return mini_batch
+
+
+def extract_features(cache_dir, params):
+    # regions and 15 minute demand of the cached pickups, the fitted models
+    # and tables are returned for the caller to save
+    coordinates, _ = load_cluster_cache(cache_dir)
+    scaler = fit_scaler(coordinates)
+    logger.info("Scaler trained successfully")
+    
+    # read the parameters
+    mini_batch_params = params["extract_features"]["mini_batch_kmeans"]
+    print("Parameters for clustering are ", mini_batch_params)
+    mini_batch = fit_kmeans(coordinates, scaler, mini_batch_params)
+    logger.info("KMeans trained successfully")
+    
+    # rasterize the regions for the lookups
+    grid = build_region_grid(scaler, mini_batch, **params["region_grid"])
+    
+    # assign the regions chunk wise across processes
+    assignment_params = params["extract_features"]["region_assignment"]
+    pickup_times, cluster_predictions = assign_regions(cache_dir, grid,
+                                                       **assignment_params)
+    
+    # read the alpha parameters
+    ewma_params = params["extract_features"]["ewma"]
+    print("Parameters for EWMA are ", ewma_params)    
+    
+    # count the pickups in 15 minute slots and calculate avg pickups
+    # using EWMA on the dense region x slot matrix
+    # keep enough trailing pickups in the checkpoint for the lag features
+    history = required_history(**params["feature_processing"]["features"])
+    resampled_data, checkpoint = resample_demand(
+        pickup_times, cluster_predictions,
+        n_regions=mini_batch_params["n_clusters"], history=history,
+        **ewma_params)
+    logger.info("Data converted to 15 min intervals successfully")
+    logger.info("Average pickups calculated successfully using EWMA")
+    return scaler, mini_batch, grid, resampled_data, checkpoint
+
+
 def save_model(model, save_path):
     joblib.dump(model, save_path)
     
@@ -41,100 +214,34 @@ if __name__ == "__main__":
     current_path = Path(__file__)
     # set the root path
     root_path = current_path.parent.parent.parent
+    params = read_params()
     # data_path
-    data_path = root_path / "data/interim/df_without_outliers.csv"
+    data_path = get_interim_path(root_path, params["data_ingestion"])
     
-    # read the data for clustering
-    df_reader = read_cluster_input(data_path)
-    logger.info("Data read successfully")
+    # cache the data for clustering in a single pass
+    cache_dir = root_path / "data/interim/cluster_cache"
+    build_cluster_cache(data_path, cache_dir)
+    logger.info("Data cached successfully")
     
-    # train the standard scaler
-    scaler = StandardScaler()
-    # train for each chunk
-    for chunk in df_reader:
-        # fit the scaler
-        scaler.partial_fit(chunk)
+    # fit the models and resample the demand
+    (scaler, mini_batch, _,
+     resampled_data, checkpoint) = extract_features(cache_dir, params)
         
     # save the scaler
     scaler_save_path = root_path / "models/scaler.joblib"
     save_model(scaler, scaler_save_path)
     logger.info("Scaler saved successfully")
     
-    # read the data
-    df_reader = read_cluster_input(data_path)
-    logger.info("Data read successfully")
-    
-    # read the parameters
-    mini_batch_params = read_params()["extract_features"]["mini_batch_kmeans"]
-    print("Parameters for clustering are ", mini_batch_params)
-    
-    # train the kmeans model
-    mini_batch = MiniBatchKMeans(**mini_batch_params)
-    # train for each chunk
-    for chunk in df_reader:
-        # scale the chunk
-        scaled_chunk = scaler.transform(chunk)
-        # train the model
-        mini_batch.partial_fit(scaled_chunk)
-        
     # save the model
     kmeans_save_path = root_path / "models/mb_kmeans.joblib"
-    joblib.dump(mini_batch, kmeans_save_path)
-    
-    # read the data
-    df_final = pd.read_csv(data_path, parse_dates=["tpep_pickup_datetime"])
-    logger.info("Data read for cluster predictions")
-    # perform predictions and assign clusters
-    location_subset = df_final.loc[:,["pickup_longitude","pickup_latitude"]]
-    # scale the input data
-    scaled_location_subset = scaler.transform(location_subset)
-    # get the cluster predictions
-    cluster_predictions = mini_batch.predict(scaled_location_subset)
-    
-    # save the cluster predictions in data
-    df_final['region'] = cluster_predictions
-    logger.info("Cluster predictions are added to data")
-    # drop the latitude and logitude columns from data
-    df_final = df_final.drop(columns=["pickup_latitude","pickup_longitude"])
-    logger.info("Latitude and Longitude columns are dropped")
-    
-    # set the datetime column as index
-    df_final.set_index('tpep_pickup_datetime', inplace=True)
-    # group the data by region
-    region_grp = df_final.groupby("region")
-    # resample the data in 15 minute intervals
-    resampled_data = (
-                        region_grp['region']
-                        .resample("15min")
-                        .count()
-                    )
-    logger.info("Data converted to 15 min intervals successfully")
-    resampled_data.name = "total_pickups"
-    
-    # convert back to df
-    resampled_data = resampled_data.reset_index(level=0)
-    # replace the zeros with an aribitrary value
-    epsilon_val = 10
-    resampled_data.replace({'total_pickups': {0 : epsilon_val}}, inplace=True)
-    
-    # read the alpha parameters
-    ewma_params = read_params()["extract_features"]["ewma"]
-    print("Parameters for EWMA are ", ewma_params)    
-    
-    # calculate avg pickups using EWMA
-    # dataset with pickup smoothing applied
-    resampled_data["avg_pickups"] = (
-                resampled_data
-                .groupby("region")['total_pickups']
-                .ewm(**ewma_params)
-                .mean()
-                .round()
-                .values
-            )
-    logger.info("Average pickups calculated successfully using EWMA")
+    save_model(mini_batch, kmeans_save_path)
     
     # save the data
     save_path = root_path / "data/processed/resampled_data.csv"
     resampled_data.to_csv(save_path, index=True)
     logger.info("Data saved successfully")
-    
\ No newline at end of file
+    
+    # save the checkpoint for incremental updates
+    checkpoint_save_path = root_path / "data/processed/feature_checkpoint.npz"
+    save_checkpoint(checkpoint, checkpoint_save_path)
+    logger.info("Checkpoint saved successfully")
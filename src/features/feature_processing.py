@@ -1,6 +1,9 @@
 import logging
 from pathlib import Path
 import pandas as pd
+from yaml import safe_load
+from src.features.lag_features import build_lag_features
+from src.features.feature_store import features_path, save_features
 
 
 # create a logger
@@ -16,6 +19,29 @@ logger.addHandler(handler)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+def split_features(data, split_params):
+    # split the data into train and test by month
+    in_train = data["month"].isin(split_params["train_months"])
+    in_test = data["month"].isin(split_params["test_months"])
+    trainset = data.loc[in_train].drop(columns=["month"])
+    testset = data.loc[in_test].drop(columns=["month"])
+    return trainset, testset
+
+
+def process_features(df, params):
+    # generate the lag features on the region x slot matrix
+    data = build_lag_features(df, **params["feature_processing"]["features"])
+    logger.info("Lag features generated successfully")
+    return split_features(data, params["feature_processing"])
+
+
 if __name__ == "__main__":
     # current path
     current_path = Path(__file__)
@@ -23,51 +49,26 @@ if __name__ == "__main__":
     root_path = current_path.parent.parent.parent
     # data_path
     data_path = root_path / "data/processed/resampled_data.csv"
+    params = read_params()
     
     # read the data
     df = pd.read_csv(data_path, parse_dates=["tpep_pickup_datetime"])
     logger.info("Data read successfully")
     
-    # extract the day of week information
-    df["day_of_week"] = df["tpep_pickup_datetime"].dt.day_of_week
-    # extract the month information
-    df["month"] = df["tpep_pickup_datetime"].dt.month
-    logger.info("Datetime Features extracted successfully")
-    
     # set the datetime column as index
     df.set_index("tpep_pickup_datetime", inplace=True)
     logger.info("Datetime column set as index successfully")
     
-    # create the region grouper
-    region_grp = df.groupby("region")
-    # shifting periods
-    periods = list(range(1,5))
-    # generate the lag features
-    lag_features = region_grp["total_pickups"].shift(periods)
-    logger.info("Lag features generated successfully")
-    
-    # merge them with the original df
-    data = pd.concat([lag_features,df],axis=1)
-    logger.info("Lagged features merged successfully")
-    
-    # drop the missing values
-    data.dropna(inplace=True)
-    
-    # rename column names
-    mapper = {name:f"lag_{ind+1}" for ind, name in enumerate(data.columns[0:4])}
-    data = data.rename(columns=mapper)
-    logger.info("Column names renamed successfully")
-    # split the data into train and test
-    trainset = data.loc[data["month"].isin([1,2]),"lag_1":"day_of_week"]
-
-    testset = data.loc[data["month"].isin([3]),"lag_1":"day_of_week"]
+    # generate the features and split the data into train and test
+    trainset, testset = process_features(df, params)
     
     # save the train and test data
-    train_data_save_path = root_path / "data/processed/train.csv"
-    test_data_save_path = root_path / "data/processed/test.csv"
+    train_data_save_path = features_path(root_path, "train")
+    test_data_save_path = features_path(root_path, "test")
+    export_csv = params["feature_store"]["export_csv"]
 
-    trainset.to_csv(train_data_save_path, index=True)
+    save_features(trainset, train_data_save_path, export_csv=export_csv)
     logger.info("Train data saved successfully")
     
-    testset.to_csv(test_data_save_path, index=True)
-    logger.info("Test data saved successfully")
\ No newline at end of file
+    save_features(testset, test_data_save_path, export_csv=export_csv)
+    logger.info("Test data saved successfully")
@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from pathlib import Path
+
+
+# declared dtypes of the feature tables, every other column is a float32
+# feature like lag_1 or rolling_mean_4
+feature_schema = {"region": "int8",
+                  "day_of_week": "int8",
+                  "month": "int8",
+                  "total_pickups": "int32",
+                  "avg_pickups": "float32"}
+
+index_name = "tpep_pickup_datetime"
+
+
+def features_path(root_path, name, file_format="feather"):
+    return Path(root_path) / "data/processed" / f"{name}.{file_format}"
+
+
+def stored_path(data_path):
+    # the csv table written before the move to feather, as long as the
+    # dvc.lock still tracks the csv outputs of feature_processing
+    data_path = Path(data_path)
+    csv_path = data_path.with_suffix(".csv")
+    if not data_path.exists() and csv_path.exists():
+        return csv_path
+    return data_path
+
+
+def apply_schema(df):
+    if "region" in df and df["region"].max() > np.iinfo(np.int8).max:
+        raise ValueError("Region ids do not fit the int8 feature schema")
+    dtypes = {column: feature_schema.get(column, "float32")
+              for column in df.columns}
+    df = df.astype(dtypes)
+    df.index = df.index.astype("datetime64[ns]").rename(index_name)
+    return df
+
+
+def save_features(df, save_path, export_csv=False):
+    # write the table with the declared schema, the index becomes a column
+    save_path = Path(save_path)
+    table = pa.Table.from_pandas(apply_schema(df).reset_index(),
+                                 preserve_index=False)
+    # write next to the target and swap it in, readers holding a memory
+    # map of the old file keep their data
+    temp_path = save_path.with_name(save_path.name + ".tmp")
+    if save_path.suffix == ".parquet":
+        pq.write_table(table, temp_path)
+    else:
+        # uncompressed so the file can be memory mapped on load
+        feather.write_feather(table, temp_path, compression="uncompressed")
+    os.replace(temp_path, save_path)
+    if export_csv:
+        df.to_csv(save_path.with_suffix(".csv"), index=True)
+
+
+def load_features(data_path, columns=None):
+    data_path = stored_path(data_path)
+    if columns is not None:
+        columns = [index_name, *columns]
+    if data_path.suffix == ".csv":
+        df = pd.read_csv(data_path, parse_dates=[index_name], usecols=columns)
+        return df.set_index(index_name)
+    if data_path.suffix == ".parquet":
+        table = pq.read_table(data_path, columns=columns, memory_map=True)
+    else:
+        table = feather.read_table(data_path, columns=columns, memory_map=True)
+    # numeric columns without nulls are handed over without copies
+    return table.to_pandas(split_blocks=True).set_index(index_name)
+
+
+def iter_features(data_path, chunksize=100000):
+    # the table in row chunks, only one chunk is held in memory
+    data_path = stored_path(data_path)
+    if data_path.suffix == ".csv":
+        for chunk in pd.read_csv(data_path, parse_dates=[index_name],
+                                 chunksize=chunksize):
+            yield chunk.set_index(index_name)
+        return
+    if data_path.suffix == ".parquet":
+        batches = pq.ParquetFile(data_path, memory_map=True).iter_batches(
+            batch_size=chunksize)
+    else:
+        # the batches are views of the memory mapped file
+        batches = feather.read_table(data_path, memory_map=True).to_batches(
+            max_chunksize=chunksize)
+    for batch in batches:
+        yield batch.to_pandas(split_blocks=True).set_index(index_name)
+
+
+def append_features(df, data_path, export_csv=False):
+    data_path = Path(data_path)
+    if stored_path(data_path).exists():
+        df = pd.concat([load_features(data_path), apply_schema(df)])
+    save_features(df, data_path, export_csv=export_csv)
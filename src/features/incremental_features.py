@@ -0,0 +1,156 @@
+import argparse
+import joblib
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from yaml import safe_load
+from src.data.data_ingestion import read_raw_data, stream_partitions
+from src.features.extract_features import build_cluster_cache, assign_regions
+from src.features.region_grid import build_region_grid, load_region_grid
+from src.features.demand_matrix import (append_demand, load_checkpoint,
+                                        save_checkpoint)
+from src.features.lag_features import build_lag_features, required_history
+from src.features.feature_processing import split_features
+from src.features.feature_store import features_path, append_features
+
+
+# create a logger
+logger = logging.getLogger("incremental_features")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+def history_rows(checkpoint, freq="15min"):
+    # the trailing pickups of the checkpoint as rows of the long table
+    recent_pickups = checkpoint["recent_pickups"]
+    history = recent_pickups.shape[1]
+    offsets = np.arange(history - 1, -1, -1) * pd.Timedelta(freq).value
+    times = checkpoint["last_time"].view(np.int64)[:, np.newaxis] - offsets
+    has_time = ~np.isnat(checkpoint["last_time"])[:, np.newaxis]
+    known = ~np.isnan(recent_pickups) & has_time
+    regions = np.broadcast_to(np.arange(len(recent_pickups))[:, np.newaxis],
+                              recent_pickups.shape)
+    index = pd.DatetimeIndex(times[known], name="tpep_pickup_datetime")
+    return pd.DataFrame(
+        {"region": regions[known],
+         "total_pickups": recent_pickups[known].astype(np.int64)},
+        index=index)
+
+
+def new_lag_features(resampled_data, checkpoint, feature_params):
+    # features of the new rows, continuing from the trailing pickups of the
+    # checkpoint so the rows match a full run of feature_processing
+    history = checkpoint["recent_pickups"].shape[1]
+    if required_history(**feature_params) > history:
+        raise ValueError("The checkpoint keeps too few pickups for the "
+                         "features, rerun extract_features")
+    data = build_lag_features(
+        pd.concat([history_rows(checkpoint), resampled_data]),
+        **feature_params)
+    return data.dropna(subset=["avg_pickups"])
+
+
+def route_months(data, split_params, split=None):
+    # split params with every month of the new rows in train or test, new
+    # months go to split when given. unrouted rows would be dropped while
+    # the checkpoint moves past them, so they raise before anything is written
+    split_params = dict(split_params)
+    months = set(np.unique(data["month"]).tolist())
+    if split is not None:
+        key = f"{split}_months"
+        split_params[key] = sorted(set(split_params[key]) | months)
+    unrouted = (months - set(split_params["train_months"]) -
+                set(split_params["test_months"]))
+    if unrouted:
+        raise ValueError(f"Months {sorted(unrouted)} are neither train nor "
+                         "test months, add them to "
+                         "feature_processing.train_months or test_months or "
+                         "pass --split")
+    return split_params
+
+
+if __name__ == "__main__":
+    # read the new raw files
+    parser = argparse.ArgumentParser(
+        description="Append newly arrived months to the feature tables")
+    parser.add_argument("raw_files", nargs="+", type=Path)
+    parser.add_argument("--split", choices=["train", "test"],
+                        help="table the new months are appended to, "
+                             "instead of feature_processing")
+    args = parser.parse_args()
+
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent.parent
+    params = read_params()
+
+    # ingest only the new months
+    increment_dir = root_path / "data/interim/increments"
+    ingestion_params = params["data_ingestion"]
+    df_new = read_raw_data(args.raw_files, ingestion_params)
+    n_rows = stream_partitions(
+        df_new, increment_dir / "df_without_outliers",
+        file_format=ingestion_params["file_format"],
+        max_in_flight=ingestion_params["streaming"]["max_in_flight"])
+    logger.info(f"New data ingested successfully with {n_rows} rows")
+
+    # assign the regions with the frozen scaler and kmeans
+    cache_dir = increment_dir / "cluster_cache"
+    build_cluster_cache(increment_dir / "df_without_outliers", cache_dir)
+    grid_path = root_path / "models/region_grid.npz"
+    if grid_path.exists():
+        grid = load_region_grid(grid_path)
+    else:
+        scaler = joblib.load(root_path / "models/scaler.joblib")
+        mini_batch = joblib.load(root_path / "models/mb_kmeans.joblib")
+        grid = build_region_grid(scaler, mini_batch, **params["region_grid"])
+    assignment_params = params["extract_features"]["region_assignment"]
+    pickup_times, regions = assign_regions(cache_dir, grid,
+                                           **assignment_params)
+
+    # continue the 15 minute slots and the EWMA from the checkpoint
+    checkpoint_path = root_path / "data/processed/feature_checkpoint.npz"
+    checkpoint = load_checkpoint(checkpoint_path)
+    resampled_data, new_checkpoint = append_demand(pickup_times, regions,
+                                                   checkpoint)
+    logger.info(f"{len(resampled_data)} new 15 min slots calculated "
+                "successfully")
+
+    # build the lag features of the new slots
+    data = new_lag_features(resampled_data, checkpoint,
+                            params["feature_processing"]["features"])
+    split_params = route_months(data, params["feature_processing"],
+                                split=args.split)
+
+    # append the new rows to the tables
+    resampled_data.to_csv(root_path / "data/processed/resampled_data.csv",
+                          mode="a", header=False)
+    trainset, testset = split_features(data, split_params)
+    export_csv = params["feature_store"]["export_csv"]
+    append_features(trainset, features_path(root_path, "train"),
+                    export_csv=export_csv)
+    append_features(testset, features_path(root_path, "test"),
+                    export_csv=export_csv)
+    logger.info(f"Appended {len(trainset)} train rows and {len(testset)} "
+                "test rows")
+
+    # save the checkpoint
+    save_checkpoint(new_checkpoint, checkpoint_path)
+    logger.info("Checkpoint saved successfully")
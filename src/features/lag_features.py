@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def slots_per_week(freq="15min"):
+    return pd.Timedelta("7D") // pd.Timedelta(freq)
+
+
+def required_history(lags=[1, 2, 3, 4], rolling_windows=[], weekly_lag=False,
+                     freq="15min"):
+    # number of past slots the features of one slot look back on
+    shifts = list(lags) + list(rolling_windows)
+    if weekly_lag:
+        shifts.append(slots_per_week(freq))
+    return max(shifts)
+
+
+def dense_matrix(resampled_data, column="total_pickups", freq="15min"):
+    # (n_regions x n_slots) matrix of the long table, NaN outside the
+    # region spans, together with the position of every row in it
+    times = resampled_data.index.to_numpy(dtype="datetime64[ns]")
+    times = times.view(np.int64)
+    slots = (times - times.min()) // pd.Timedelta(freq).value
+    regions = resampled_data["region"].to_numpy()
+    matrix = np.full((regions.max() + 1, slots.max() + 1), np.nan)
+    matrix[regions, slots] = resampled_data[column].to_numpy(dtype=np.float64)
+    return matrix, regions, slots
+
+
+def build_lag_features(resampled_data, lags=[1, 2, 3, 4], rolling_windows=[],
+                       weekly_lag=False, freq="15min"):
+    # lag, rolling mean and same slot last week features of the pickups as
+    # shifted views of one padded region x slot matrix
+    matrix, regions, slots = dense_matrix(resampled_data, freq=freq)
+    n_regions, n_slots = matrix.shape
+    history = required_history(lags, rolling_windows, weekly_lag, freq=freq)
+    padded = np.concatenate([np.full((n_regions, history), np.nan), matrix],
+                            axis=1)
+
+    def shifted(shift):
+        return padded[:, history - shift:history - shift + n_slots]
+
+    features = {}
+    for lag in lags:
+        features[f"lag_{lag}"] = shifted(lag)[regions, slots]
+    for window in rolling_windows:
+        # mean over the window slots before the current one
+        first = history - window
+        windows = sliding_window_view(padded, window, axis=1)
+        windows = windows[:, first:first + n_slots]
+        features[f"rolling_mean_{window}"] = (windows.mean(axis=-1)
+                                              [regions, slots])
+    if weekly_lag:
+        last_week = shifted(slots_per_week(freq))
+        features["last_week_pickups"] = last_week[regions, slots]
+
+    # merge them with the original data
+    data = pd.concat([pd.DataFrame(features, index=resampled_data.index),
+                      resampled_data], axis=1)
+    # extract the datetime features
+    data["day_of_week"] = data.index.day_of_week
+    data["month"] = data.index.month
+    # slots without a full history have no features
+    return data.dropna(subset=list(features))
@@ -0,0 +1,147 @@
+import joblib
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from yaml import safe_load
+
+
+# create a logger
+logger = logging.getLogger("region_grid")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+# marker for cells crossed by a region boundary
+mixed_cell = -1
+
+
+def nearest_regions(coordinates, grid):
+    # exact kmeans assignment of (longitude, latitude) rows in float64
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    scaled = (coordinates - grid["mean"]) / grid["scale"]
+    differences = scaled[:, np.newaxis, :] - grid["centers"][np.newaxis, :, :]
+    distances = (differences ** 2).sum(axis=2)
+    return distances.argmin(axis=1).astype(np.int16)
+
+
+def build_region_grid(scaler, mini_batch, cell_size=0.0005):
+    # the grid covers the inlier box of the ingestion stage
+    from src.data.data_ingestion import (min_latitude, max_latitude,
+                                         min_longitude, max_longitude)
+    n_cols = int(np.ceil(round((max_longitude - min_longitude) / cell_size,
+                               6)))
+    n_rows = int(np.ceil(round((max_latitude - min_latitude) / cell_size, 6)))
+    grid = {"origin": np.array([min_longitude, min_latitude]),
+            "cell_size": np.float64(cell_size),
+            "mean": scaler.mean_.astype(np.float64),
+            "scale": scaler.scale_.astype(np.float64),
+            "centers": mini_batch.cluster_centers_.astype(np.float64)}
+
+    # label every cell corner with the kmeans region
+    corner_longitudes = min_longitude + cell_size * np.arange(n_cols + 1)
+    corner_latitudes = min_latitude + cell_size * np.arange(n_rows + 1)
+    mesh_longitudes, mesh_latitudes = np.meshgrid(corner_longitudes,
+                                                  corner_latitudes)
+    corners = np.column_stack([mesh_longitudes.ravel(),
+                               mesh_latitudes.ravel()])
+    corner_regions = nearest_regions(corners, grid).reshape(n_rows + 1,
+                                                            n_cols + 1)
+
+    # kmeans regions are convex, so a cell whose four corners agree lies
+    # entirely inside that region, every other cell is resolved exactly
+    cells = corner_regions[:-1, :-1].copy()
+    agree = ((cells == corner_regions[1:, :-1]) &
+             (cells == corner_regions[:-1, 1:]) &
+             (cells == corner_regions[1:, 1:]))
+    cells[~agree] = mixed_cell
+    grid["cells"] = cells
+    logger.info(f"Region grid built with {n_rows}x{n_cols} cells, "
+                f"{(~agree).mean():.2%} of them on region boundaries")
+    return grid
+
+
+def lookup_regions(grid, coordinates):
+    # coordinates are (longitude, latitude) rows
+    coordinates = np.asarray(coordinates)
+    cells = grid["cells"]
+    cell_index = np.floor((coordinates - grid["origin"]) / grid["cell_size"])
+    cols, rows = cell_index.astype(np.int64).T
+    inside = ((cols >= 0) & (cols < cells.shape[1]) &
+              (rows >= 0) & (rows < cells.shape[0]))
+
+    regions = np.full(len(coordinates), mixed_cell, dtype=np.int16)
+    regions[inside] = cells[rows[inside], cols[inside]]
+    # boundary cells and points outside the box fall back to kmeans
+    unresolved = regions == mixed_cell
+    if unresolved.any():
+        regions[unresolved] = nearest_regions(coordinates[unresolved], grid)
+    return regions
+
+
+def check_region_grid(grid, scaler, mini_batch, n_samples=100000,
+                      random_state=42):
+    # sample points on the cell edges, where a coarse grid would go wrong
+    rng = np.random.default_rng(random_state)
+    n_rows, n_cols = grid["cells"].shape
+    rows = rng.integers(0, n_rows, n_samples)
+    cols = rng.integers(0, n_cols, n_samples)
+    offsets = rng.choice([0.0, 1e-9, 1.0 - 1e-9], size=(n_samples, 2))
+    samples = grid["origin"] + grid["cell_size"] * np.column_stack(
+        [cols + offsets[:, 0], rows + offsets[:, 1]])
+    samples_df = pd.DataFrame(samples,
+                              columns=["pickup_longitude", "pickup_latitude"])
+    expected = mini_batch.predict(scaler.transform(samples_df))
+    mismatches = int((lookup_regions(grid, samples) != expected).sum())
+    logger.info(f"Region grid checked on {n_samples} boundary points with "
+                f"{mismatches} mismatches")
+    return mismatches
+
+
+def save_region_grid(grid, save_path):
+    np.savez(save_path, **grid)
+
+
+def load_region_grid(grid_path):
+    with np.load(grid_path) as grid:
+        return {key: grid[key] for key in grid.files}
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+if __name__ == "__main__":
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent.parent
+
+    # load the scaler and the kmeans model
+    scaler = joblib.load(root_path / "models/scaler.joblib")
+    mini_batch = joblib.load(root_path / "models/mb_kmeans.joblib")
+    logger.info("Scaler and kmeans model loaded successfully")
+
+    # build the grid
+    grid_params = read_params()["region_grid"]
+    grid = build_region_grid(scaler, mini_batch, **grid_params)
+
+    # verify the grid against kmeans
+    mismatches = check_region_grid(grid, scaler, mini_batch)
+    if mismatches:
+        raise ValueError(f"Region grid disagrees with kmeans on "
+                         f"{mismatches} points")
+
+    # save the grid
+    save_region_grid(grid, root_path / "models/region_grid.npz")
+    logger.info("Region grid saved successfully")
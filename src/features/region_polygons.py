@@ -0,0 +1,148 @@
+import json
+import joblib
+import logging
+import numpy as np
+from pathlib import Path
+
+
+# create a logger
+logger = logging.getLogger("region_polygons")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+# kilometres per degree of latitude and of longitude at the equator
+km_per_degree_latitude = 110.574
+km_per_degree_longitude = 111.320
+
+
+def clip_polygon(polygon, normal, offset):
+    # part of a convex polygon with normal·x <= offset
+    values = polygon @ normal - offset
+    clipped = []
+    for ind in range(len(polygon)):
+        next_ind = (ind + 1) % len(polygon)
+        current, following = polygon[ind], polygon[next_ind]
+        current_value, following_value = values[ind], values[next_ind]
+        if current_value <= 0:
+            clipped.append(current)
+        if (current_value <= 0) != (following_value <= 0):
+            # the edge crosses the clipping line
+            fraction = current_value / (current_value - following_value)
+            clipped.append(current + fraction * (following - current))
+    return np.array(clipped).reshape(-1, 2)
+
+
+def voronoi_cells(centers, box):
+    # cell of every center inside the convex box, the cells are built by
+    # clipping the box with the bisector of every other center
+    cells = []
+    for ind, center in enumerate(centers):
+        cell = box
+        for other_ind, other in enumerate(centers):
+            if other_ind == ind or len(cell) == 0:
+                continue
+            cell = clip_polygon(cell, other - center,
+                                (other @ other - center @ center) / 2)
+        cells.append(cell)
+    return cells
+
+
+def polygon_area_centroid(polygon):
+    # area in km² and centroid in degrees of a (longitude, latitude) polygon
+    # with the local equirectangular projection
+    km_per_longitude = (km_per_degree_longitude *
+                        np.cos(np.radians(polygon[:, 1].mean())))
+    x, y = polygon[:, 0], polygon[:, 1]
+    x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+    cross = x * y_next - x_next * y
+    signed_area = cross.sum() / 2
+    centroid = np.array([((x + x_next) * cross).sum(),
+                         ((y + y_next) * cross).sum()]) / (6 * signed_area)
+    area = abs(signed_area) * km_per_longitude * km_per_degree_latitude
+    return area, centroid
+
+
+def build_region_polygons(scaler, mini_batch, precision=6):
+    # kmeans assigns by distance in the scaled space, so the regions are the
+    # voronoi cells of the centers there, mapped back to degrees and clipped
+    # to the inlier box of the ingestion stage
+    from src.data.data_ingestion import (min_latitude, max_latitude,
+                                         min_longitude, max_longitude)
+    mean = scaler.mean_.astype(np.float64)
+    scale = scaler.scale_.astype(np.float64)
+    box = np.array([[min_longitude, min_latitude],
+                    [max_longitude, min_latitude],
+                    [max_longitude, max_latitude],
+                    [min_longitude, max_latitude]])
+    cells = voronoi_cells(mini_batch.cluster_centers_.astype(np.float64),
+                          (box - mean) / scale)
+
+    features = []
+    for region, cell in enumerate(cells):
+        if len(cell) < 3:
+            continue
+        polygon = cell * scale + mean
+        area, centroid = polygon_area_centroid(polygon)
+        ring = np.round(np.vstack([polygon, polygon[:1]]), precision).tolist()
+        properties = {"region": region,
+                      "centroid": np.round(centroid, precision).tolist(),
+                      "area_km2": round(float(area), 4)}
+        features.append({"type": "Feature",
+                         "geometry": {"type": "Polygon",
+                                      "coordinates": [ring]},
+                         "properties": properties})
+    logger.info(f"{len(features)} region polygons built")
+    return {"type": "FeatureCollection", "features": features}
+
+
+def polygon_regions(region_polygons, coordinates):
+    # region of every (longitude, latitude) row from the convex polygons,
+    # -1 for points outside of all of them
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    regions = np.full(len(coordinates), -1, dtype=np.int16)
+    for feature in region_polygons["features"]:
+        ring = np.array(feature["geometry"]["coordinates"][0][:-1])
+        edges = np.roll(ring, -1, axis=0) - ring
+        # counter clockwise rings have every inner point left of every edge
+        offsets = coordinates[:, np.newaxis, :] - ring[np.newaxis, :, :]
+        cross = edges[:, 0] * offsets[:, :, 1] - edges[:, 1] * offsets[:, :, 0]
+        inside = (cross >= -1e-12).all(axis=1) & (regions == -1)
+        regions[inside] = feature["properties"]["region"]
+    return regions
+
+
+def save_region_polygons(region_polygons, save_path):
+    with open(save_path, "w") as file:
+        json.dump(region_polygons, file)
+
+
+def load_region_polygons(polygons_path):
+    with open(polygons_path, "r") as file:
+        return json.load(file)
+
+
+if __name__ == "__main__":
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent.parent
+
+    # load the scaler and the kmeans model
+    scaler = joblib.load(root_path / "models/scaler.joblib")
+    mini_batch = joblib.load(root_path / "models/mb_kmeans.joblib")
+    logger.info("Scaler and kmeans model loaded successfully")
+
+    # build and save the polygons
+    region_polygons = build_region_polygons(scaler, mini_batch)
+    save_region_polygons(region_polygons,
+                         root_path / "models/region_polygons.geojson")
+    logger.info("Region polygons saved successfully")
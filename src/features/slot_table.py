@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+def slot_positions(base_time, slot_ns, n_slots, timestamps):
+    # integer slot of every timestamp counted from base_time, -1 outside
+    # of the n_slots or between two slot starts
+    times = np.asarray(timestamps, dtype="datetime64[ns]").view(np.int64)
+    base_time = np.asarray(base_time, dtype="datetime64[ns]")
+    offsets = times - base_time.astype(np.int64)
+    slots = offsets // slot_ns
+    inside = (offsets % slot_ns == 0) & (slots >= 0) & (slots < n_slots)
+    return np.where(inside, slots, -1)
+
+
+def build_slot_table(df, n_regions=None, freq="15min"):
+    # the feature table as a dense (n_slots x n_columns x n_regions) array,
+    # every slot holds each column over its regions in order and rows
+    # missing in the table are marked in present
+    times = df.index.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    slot_ns = pd.Timedelta(freq).value
+    slots = (times - times.min()) // slot_ns
+    regions = df["region"].to_numpy(dtype=np.int64)
+    if n_regions is None:
+        n_regions = regions.max() + 1
+    values = np.full((slots.max() + 1, len(df.columns), n_regions), np.nan)
+    values[slots, :, regions] = df.to_numpy(dtype=np.float64)
+    present = np.zeros((slots.max() + 1, n_regions), dtype=bool)
+    present[slots, regions] = True
+    return {"base_time": np.array(times.min(), dtype="datetime64[ns]"),
+            "slot_ns": np.int64(slot_ns),
+            "columns": np.asarray(df.columns, dtype=str),
+            "values": values,
+            "present": present}
+
+
+def table_slots(table, timestamps):
+    return slot_positions(table["base_time"], table["slot_ns"],
+                          len(table["values"]), timestamps)
+
+
+def slot_rows(table, timestamp):
+    # regions and feature columns of one slot, the columns are contiguous
+    # views of the table when every region has a row, None when the slot is
+    # not stored
+    timestamp = np.datetime64(pd.Timestamp(timestamp), "ns")
+    slot = table_slots(table, [timestamp])[0]
+    if slot < 0 or not table["present"][slot].any():
+        return None
+    rows, present = table["values"][slot], table["present"][slot]
+    if not present.all():
+        rows = rows[:, present]
+    columns = {column: rows[ind]
+               for ind, column in enumerate(table["columns"])}
+    return np.flatnonzero(present), columns
+
+
+def gather_rows(table, slots, regions):
+    # feature columns of the given (slot, region) pairs
+    return {column: table["values"][slots, ind, regions]
+            for ind, column in enumerate(table["columns"])}
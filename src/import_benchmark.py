@@ -0,0 +1,104 @@
+import ast
+import json
+import logging
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+from yaml import safe_load
+
+
+# create a logger
+logger = logging.getLogger("import_benchmark")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+def entry_imports(entry, root_path=Path(".")):
+    # the code an entry point imports with: a module is imported as a whole,
+    # a script like app.py only runs its top level import statements
+    if not entry.endswith(".py"):
+        return f"import {entry}"
+    tree = ast.parse((root_path / entry).read_text())
+    return "\n".join(ast.unparse(node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_times(code, cwd="."):
+    # self time in ms of every top level package from python -X importtime
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, cwd=cwd)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    packages = Counter()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+    return packages
+
+
+def benchmark_entry(entry, repeats=3, root_path=Path(".")):
+    # the fastest of the fresh interpreter runs, import times are noisy
+    code = entry_imports(entry, root_path)
+    runs = [import_times(code, cwd=root_path) for _ in range(repeats)]
+    packages = min(runs, key=lambda packages: sum(packages.values()))
+    return {"total_ms": round(sum(packages.values()), 1),
+            "top_packages": {name: round(ms, 1)
+                             for name, ms in packages.most_common(8)}}
+
+
+if __name__ == "__main__":
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent
+    benchmark_params = read_params()["import_benchmark"]
+
+    # time every entry point against its budget
+    report, over_budget = {}, []
+    for entry, budget_ms in benchmark_params["budget_ms"].items():
+        try:
+            result = benchmark_entry(entry,
+                                     repeats=benchmark_params["repeats"],
+                                     root_path=root_path)
+        except RuntimeError as e:
+            # an entry that can not be imported fails the benchmark as well
+            logger.error(f"{entry} could not be imported: {e}")
+            report[entry] = {"error": str(e), "budget_ms": budget_ms}
+            over_budget.append(entry)
+            continue
+        result["budget_ms"] = budget_ms
+        report[entry] = result
+        top_packages = list(result["top_packages"].items())[:4]
+        top = ", ".join(f"{name} {ms:.0f}" for name, ms in top_packages)
+        logger.info(f"{entry:<34}{result['total_ms']:>8.0f} ms "
+                    f"(budget {budget_ms} ms) {top}")
+        if result["total_ms"] > budget_ms:
+            over_budget.append(entry)
+
+    # save the report
+    with open(root_path / "reports/import_times.json", "w") as f:
+        json.dump(report, f, indent=4)
+
+    if over_budget:
+        logger.error("Over budget or not importable: "
+                     f"{', '.join(over_budget)}")
+        sys.exit(1)
+    logger.info("All entry points within their import budget")
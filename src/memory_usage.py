@@ -0,0 +1,34 @@
+import resource
+from pathlib import Path
+
+
+# linux keeps the peak RSS of a process in VmHWM and resets it to the
+# current RSS when 5 is written to clear_refs
+status_path = Path("/proc/self/status")
+clear_refs_path = Path("/proc/self/clear_refs")
+
+
+def reset_peak_rss():
+    # start a new peak, False where the peak can not be reset and only the
+    # lifetime peak of the process is known
+    try:
+        clear_refs_path.write_text("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_mb():
+    # peak RSS since the last reset, ru_maxrss (kilobytes on linux) is the
+    # lifetime peak of the process
+    if status_path.exists():
+        for line in status_path.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measured_peak_rss_mb(reset):
+    # the peak of a measurement that began with reset_peak_rss, NaN when the
+    # reset did not work and the value would include earlier work
+    return round(peak_rss_mb(), 1) if reset else float("nan")
@@ -0,0 +1,158 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from joblib import Parallel, delayed
+from yaml import safe_load
+from src.features.feature_store import features_path, load_features
+from src.models.train import categorical_columns, make_encoder
+from src.models.sparse_linear import (accumulate_normal_equations,
+                                      solve_normal_equations,
+                                      linear_regression)
+from src.models.compiled_model import compile_model, predict_compiled
+
+
+# create a logger
+logger = logging.getLogger("backtest")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+
+def sort_by_time(df):
+    # one stable sort, every fold is then a contiguous range of rows
+    order = np.argsort(df.index.to_numpy(dtype="datetime64[ns]"),
+                       kind="stable")
+    return df.iloc[order]
+
+
+def fold_bounds(times, n_folds, test_slots, freq="15min"):
+    # expanding window folds on the slot axis of the time sorted rows, fold k
+    # trains on all slots before its origin and tests on the test_slots after
+    # it, the last fold ends with the data. rows[bounds[k]:bounds[k + 1]] is
+    # the test block of fold k and rows[:bounds[k]] its training rows
+    times = np.asarray(times, dtype="datetime64[ns]").view(np.int64)
+    slot_ns = pd.Timedelta(freq).value
+    slots = (times - times[0]) // slot_ns
+    n_slots = slots[-1] + 1
+    origins = n_slots - test_slots * np.arange(n_folds, -1, -1)
+    if origins[0] <= 0:
+        raise ValueError(f"{n_folds} folds of {test_slots} slots need "
+                         f"more than {n_slots} slots")
+    bounds = np.searchsorted(slots, origins)
+    origin_times = (times[0] + origins * slot_ns).astype("datetime64[ns]")
+    return origin_times, bounds
+
+
+def block_statistics(X, y, encoder):
+    # XᵀX and Xᵀy of one block, the training statistics of a fold are the
+    # sums over the blocks before its origin
+    return accumulate_normal_equations([(X, y)], encoder)
+
+
+def score_fold(gram, moment, encoder, X_test, y_test):
+    # absolute percentage errors of the fold model like
+    # mean_absolute_percentage_error
+    coef, intercept = solve_normal_equations(gram, moment)
+    model = linear_regression(coef, intercept, encoder.get_feature_names_out())
+    y_pred = predict_compiled(compile_model(encoder, model), X_test)
+    y_true = y_test.to_numpy(dtype=np.float64)
+    return (np.abs(y_pred - y_true) /
+            np.maximum(np.abs(y_true), np.finfo(np.float64).eps))
+
+
+def backtest(df, n_folds=8, test_slots=672, n_jobs=-1, freq="15min"):
+    # per fold and per region MAPE of the linear model over rolling origins,
+    # every row is encoded once for the training statistics and once more
+    # for the fold it is tested in
+    data = sort_by_time(df)
+    X, y = data.drop(columns=["total_pickups"]), data["total_pickups"]
+    origin_times, bounds = fold_bounds(data.index, n_folds, test_slots,
+                                       freq=freq)
+    starts = np.concatenate([[0], bounds[:-2]])
+
+    # the categories of the whole data fix the column layout of every fold
+    encoder = make_encoder(categories=[np.unique(X[column])
+                                       for column in categorical_columns])
+    encoder.fit(X.iloc[:bounds[0]])
+
+    # statistics of the blocks between the origins, fitted in parallel
+    blocks = Parallel(n_jobs=n_jobs)(
+        delayed(block_statistics)(X.iloc[start:stop], y.iloc[start:stop],
+                                  encoder)
+        for start, stop in zip(starts, bounds[:-1]))
+    grams = np.cumsum([gram for gram, _ in blocks], axis=0)
+    moments = np.cumsum([moment for _, moment in blocks], axis=0)
+
+    # fold k trains on blocks 0..k and is scored on the next one
+    tests = [slice(bounds[fold], bounds[fold + 1]) for fold in range(n_folds)]
+    errors = Parallel(n_jobs=n_jobs)(
+        delayed(score_fold)(grams[fold], moments[fold], encoder,
+                            X.iloc[test], y.iloc[test])
+        for fold, test in enumerate(tests))
+
+    # per region means of the errors with one bincount per fold
+    regions = X["region"].to_numpy(dtype=np.int64)
+    n_regions = regions.max() + 1
+    folds, region_errors = [], np.full((n_folds, n_regions), np.nan)
+    for fold, fold_errors in enumerate(errors):
+        fold_regions = regions[bounds[fold]:bounds[fold + 1]]
+        counts = np.bincount(fold_regions, minlength=n_regions)
+        with np.errstate(invalid="ignore"):
+            region_errors[fold] = np.bincount(fold_regions,
+                                              weights=fold_errors,
+                                              minlength=n_regions) / counts
+        folds.append({"fold": fold,
+                      "origin": origin_times[fold],
+                      "test_end": origin_times[fold + 1],
+                      "n_train": bounds[fold],
+                      "n_test": len(fold_errors),
+                      "MAPE": fold_errors.mean()})
+    folds = pd.DataFrame(folds).set_index("fold")
+    regions = pd.DataFrame(region_errors,
+                           index=pd.Index(range(n_folds), name="fold"),
+                           columns=pd.Index(range(n_regions), name="region"))
+    return folds, regions
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+if __name__ == "__main__":
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent.parent
+    backtest_params = read_params()["backtest"]
+
+    # the train and test features are loaded once for all folds
+    df = pd.concat([load_features(features_path(root_path, "train")),
+                    load_features(features_path(root_path, "test"))])
+    logger.info("Data read successfully")
+
+    start_time = time.perf_counter()
+    folds, regions = backtest(df, **backtest_params)
+    logger.info(f"Backtest of {len(folds)} folds finished in "
+                f"{time.perf_counter() - start_time:.2f} s")
+    for fold, row in folds.iterrows():
+        logger.info(f"Fold {fold} from {row['origin']}: "
+                    f"MAPE {row['MAPE']:.4f}")
+    logger.info(f"MAPE over the folds: {folds['MAPE'].mean():.4f} "
+                f"± {folds['MAPE'].std():.4f}")
+
+    # save the fold and region tables
+    folds.to_csv(root_path / "reports/backtest_folds.csv")
+    regions.to_csv(root_path / "reports/backtest_regions.csv")
+    logger.info("Backtest results saved successfully")
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def compile_model(encoder, model):
+    # the one hot terms of a linear model are additive offsets per category,
+    # they are stored as tables indexed by the category value next to the
+    # coefficients of the passthrough columns. scipy and sklearn come in
+    # with sparse_linear, predictions only need numpy
+    from src.models.sparse_linear import encoded_columns
+    ohe, passthrough = encoded_columns(encoder)
+    coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+    drop_idxs = ohe.drop_idx_
+    if drop_idxs is None:
+        drop_idxs = [None] * len(ohe.categories_)
+    compiled = {"intercept": np.float64(model.intercept_),
+                "categorical_columns": np.asarray(ohe.feature_names_in_,
+                                                  dtype=str),
+                "passthrough_columns": np.asarray(passthrough, dtype=str)}
+    position = 0
+    for column, categories, drop_idx in zip(ohe.feature_names_in_,
+                                            ohe.categories_, drop_idxs):
+        if (not np.issubdtype(categories.dtype, np.integer) or
+                categories.min() < 0):
+            raise ValueError(f"Column {column} needs non negative integer "
+                             "categories to be compiled")
+        kept = categories
+        if drop_idx is not None:
+            kept = np.delete(categories, drop_idx)
+        # unseen categories stay NaN, the dropped one has no offset
+        offsets = np.full(int(categories.max()) + 1, np.nan)
+        offsets[categories] = 0.0
+        offsets[kept] = coef[position:position + len(kept)]
+        compiled[f"offsets_{column}"] = offsets
+        position += len(kept)
+    compiled["passthrough_coef"] = coef[position:]
+    return compiled
+
+
+def predict_compiled(compiled, X):
+    # same result as Pipeline([encoder, model]).predict(X) for a frame or a
+    # dict of arrays
+    passthrough = np.column_stack(
+        [np.asarray(X[column], dtype=np.float64)
+         for column in compiled["passthrough_columns"]])
+    predictions = (passthrough @ compiled["passthrough_coef"] +
+                   compiled["intercept"])
+    for column in compiled["categorical_columns"]:
+        offsets = compiled[f"offsets_{column}"]
+        values = np.asarray(X[column], dtype=np.int64)
+        if values.min() < 0 or values.max() >= len(offsets):
+            raise ValueError(f"Found unknown categories in column {column}")
+        predictions += offsets[values]
+    if np.isnan(predictions).any():
+        raise ValueError("Found unknown categories in the input")
+    return predictions
+
+
+def save_compiled_model(compiled, save_path):
+    np.savez(save_path, **compiled)
+
+
+def load_compiled_model(model_path):
+    with np.load(model_path) as compiled:
+        return {key: compiled[key] for key in compiled.files}
@@ -1,23 +1,16 @@
-import mlflow
-import dagshub
 import json
-import pandas as pd
 import joblib
+import numpy as np
+import pandas as pd
 from pathlib import Path
 import logging
+import tempfile
 from sklearn import set_config
 from sklearn.metrics import mean_absolute_percentage_error
+from src.features.feature_store import features_path, load_features
+from src.models.tracking import init_tracking, BackgroundRun
 
 
-import dagshub
-dagshub.init(repo_owner='MohammoD2', repo_name='Uber_Demand_Pridiction-', mlflow=True)
-
-# set the mlflow tracking uri
-mlflow.set_tracking_uri("https://dagshub.com/MohammoD2/Uber_Demand_Pridiction-.mlflow")
-
-# set the experiment name
-mlflow.set_experiment("DVC Pipeline")
-
 set_config(transform_output="pandas")
 
 # create a logger
@@ -33,6 +26,120 @@ logger.addHandler(handler)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 
+def evaluate_model(df, encoder, model):
+    # make X_test and y_test
+    X_test = df.drop(columns=["total_pickups"])
+    y_test = df["total_pickups"]
+    
+    # transform the test data
+    X_test_encoded = encoder.transform(X_test)
+    logger.info("Data transformed successfully")
+    
+    # make predictions
+    y_pred = model.predict(X_test_encoded)
+    
+    # calculate the loss
+    loss = mean_absolute_percentage_error(y_test, y_pred)
+    logger.info(f"Loss: {loss}")
+    return loss, X_test_encoded, y_pred
+
+
+def group_errors(keys, y_true, y_pred, n_groups):
+    # count, APE, absolute and signed error sums of every group
+    errors = y_pred - y_true
+    ape = np.abs(errors) / np.maximum(np.abs(y_true), np.finfo(np.float64).eps)
+    return np.stack([np.bincount(keys, minlength=n_groups),
+                     np.bincount(keys, weights=ape, minlength=n_groups),
+                     np.bincount(keys, weights=np.abs(errors),
+                                 minlength=n_groups),
+                     np.bincount(keys, weights=errors, minlength=n_groups)])
+
+
+def error_metrics(sums):
+    # MAPE, MAE and bias from the summed errors, NaN for empty groups
+    count, ape, absolute, signed = sums
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {"MAPE": ape / count,
+                "MAE": absolute / count,
+                "bias": signed / count,
+                "count": count}
+
+
+def error_breakdown(df, y_pred, freq="15min"):
+    # MAPE, MAE and bias per region and per time of day from one grouped
+    # reduction over the (region, time of day) cells, the marginals and the
+    # overall metrics are sums over the cell totals
+    y_true = df["total_pickups"].to_numpy(dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    regions = df["region"].to_numpy(dtype=np.int64)
+    times = df.index.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    slot_ns = pd.Timedelta(freq).value
+    day_ns = pd.Timedelta("1D").value
+    n_regions, n_times = regions.max() + 1, day_ns // slot_ns
+    time_of_day = (times % day_ns) // slot_ns
+
+    cells = group_errors(regions * n_times + time_of_day, y_true, y_pred,
+                         n_regions * n_times)
+    cells = cells.reshape(4, n_regions, n_times)
+    overall = error_metrics(cells.sum(axis=(1, 2)))
+    by_region = error_metrics(cells.sum(axis=2))
+    by_time = error_metrics(cells.sum(axis=1))
+
+    def to_lists(metrics):
+        # NaN is not valid json, empty groups are written as null
+        return {name: [None if np.isnan(value) else float(value)
+                       for value in values]
+                for name, values in metrics.items()}
+
+    # hh:mm of the start of every slot
+    slot_times = [str(pd.Timedelta(slot * slot_ns))[-8:-3]
+                  for slot in range(n_times)]
+    return {"overall": {name: float(value)
+                        for name, value in overall.items()},
+            "region": {"region": list(range(n_regions)),
+                       **to_lists(by_region)},
+            "time_of_day": {"time": slot_times, **to_lists(by_time)}}
+
+
+def save_error_breakdown(report, save_path):
+    with open(save_path, "w") as f:
+        json.dump(report, f)
+
+
+def log_evaluation(mlflow, model, loss, report, train_df, test_df,
+                   X_test_encoded, y_pred, artifact_path="demand_prediction"):
+    # log the model parameters
+    mlflow.log_params(model.get_params())
+    
+    # log the mertic
+    mlflow.log_metric("MAPE", loss)
+    mlflow.log_metrics({"MAE": report["overall"]["MAE"],
+                        "bias": report["overall"]["bias"]})
+    
+    # log the breakdown by region and time of day
+    mlflow.log_dict(report, "error_breakdown.json")
+    
+    # converts the datasets into mlfow datasets
+    training_data = mlflow.data.from_pandas(train_df, targets="total_pickups")
+    validation_data = mlflow.data.from_pandas(test_df, targets="total_pickups")
+    
+    # log the datasets
+    mlflow.log_input(training_data, "training")
+    mlflow.log_input(validation_data, "validation")
+    
+    # model signature
+    model_signature = mlflow.models.infer_signature(X_test_encoded, y_pred)
+    
+    # the sklearn model is saved as plain run artifacts, so runs:/ uris
+    # load it from any store and a sync copies it with the run
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_dir = Path(tmp_dir) / artifact_path
+        mlflow.sklearn.save_model(model, model_dir,
+                                  signature=model_signature,
+                                  pip_requirements="requirements.txt")
+        mlflow.log_artifacts(model_dir, artifact_path)
+
+
 def load_model(model_path):
     model = joblib.load(model_path)
     return model
@@ -54,72 +161,43 @@ if __name__ == "__main__":
     # set the root path
     root_path = current_path.parent.parent.parent
     # data_path
-    train_data_path = root_path / "data/processed/train.csv"
-    test_data_path = root_path / "data/processed/test.csv"
+    train_data_path = features_path(root_path, "train")
+    test_data_path = features_path(root_path, "test")
     
     # read the data
-    df = pd.read_csv(test_data_path, parse_dates=["tpep_pickup_datetime"])
+    df = load_features(test_data_path)
     logger.info("Data read successfully")
     
-    # set the datetime column as index
-    df.set_index("tpep_pickup_datetime", inplace=True)
-    
-    # make X_test and y_test
-    X_test = df.drop(columns=["total_pickups"])
-    y_test = df["total_pickups"]
-    
     # load the encoder
     encoder_path = root_path / "models/encoder.joblib"
     encoder = joblib.load(encoder_path)
     logger.info("Encoder loaded successfully")
     
-    # transform the test data
-    X_test_encoded = encoder.transform(X_test)
-    logger.info("Data transformed successfully")
-    
     # load the model
     model_path = root_path / "models/model.joblib"
     model = load_model(model_path)
     logger.info("Model loaded successfully")
     
-    # make predictions
-    y_pred = model.predict(X_test_encoded)
+    # transform the test data, predict and calculate the loss
+    loss, X_test_encoded, y_pred = evaluate_model(df, encoder, model)
     
-    # calculate the loss
-    loss = mean_absolute_percentage_error(y_test, y_pred)
-    logger.info(f"Loss: {loss}")
+    # break the errors down by region and time of day
+    report = error_breakdown(df, y_pred)
+    save_error_breakdown(report, root_path / "reports/error_breakdown.json")
+    logger.info("Error breakdown saved successfully")
     
     # mlflow tracking
-    with mlflow.start_run(run_name="model"):    
-        # log the model parameters
-        mlflow.log_params(model.get_params())
-        
-        # log the mertic
-        mlflow.log_metric("MAPE", loss)
-        
-        # converts the datasets into mlfow datasets
-        training_data = mlflow.data.from_pandas(pd.read_csv(train_data_path, parse_dates=["tpep_pickup_datetime"]).set_index("tpep_pickup_datetime"), targets="total_pickups")
-        
-        validation_data = mlflow.data.from_pandas(pd.read_csv(test_data_path, parse_dates=["tpep_pickup_datetime"]).set_index("tpep_pickup_datetime"), targets="total_pickups")
-        
-        # log the datasets
-        mlflow.log_input(training_data, "training")
-        mlflow.log_input(validation_data, "validation")
-        
-        # model signature
-        model_signature = mlflow.models.infer_signature(X_test_encoded, y_pred)
-        
-        # log sklearn model
-        logged_model = mlflow.sklearn.log_model(model, "demand_prediction", 
-                                 signature=model_signature,
-                                 pip_requirements="requirements.txt")
-        
-        
-    # get the run id and arifact uri
-    run_id = logged_model.run_id
-    artifact_path = logged_model.artifact_path
-    model_uri = logged_model.model_uri 
-    logger.info("Mlflow logging complete")
+    mlflow = init_tracking()
+    experiment = mlflow.set_experiment("DVC Pipeline")
+    
+    # the logging runs in the background while the run information is saved
+    run = BackgroundRun(mlflow, experiment.experiment_id, run_name="model")
+    artifact_path = "demand_prediction"
+    run.submit(log_evaluation, mlflow, model, loss, report,
+               load_features(train_data_path), df, X_test_encoded, y_pred,
+               artifact_path=artifact_path)
+    run_id = run.run_id
+    model_uri = f"runs:/{run_id}/{artifact_path}"
     
     # save to json file
     json_file_save_path = root_path / "run_information.json"
@@ -129,4 +207,8 @@ if __name__ == "__main__":
                          path=json_file_save_path)
     logger.info("Run information saved successfully")
     
+    # wait for the logging calls
+    run.close()
+    logger.info("Mlflow logging complete")
+    
     
\ No newline at end of file
@@ -0,0 +1,97 @@
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from yaml import safe_load
+from src.features.feature_store import features_path, load_features
+from src.features.slot_table import slot_positions
+from src.models.compiled_model import load_compiled_model, predict_compiled
+
+
+# create a logger
+logger = logging.getLogger("forecast_cache")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+
+def materialize_forecasts(df, compiled, freq="15min"):
+    # predictions of every (slot, region) of the feature table as a dense
+    # (n_slots x n_regions) array, NaN where the table has no row
+    predictions = predict_compiled(compiled,
+                                   df.drop(columns=["total_pickups"]))
+    times = df.index.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    slot_ns = pd.Timedelta(freq).value
+    slots = (times - times.min()) // slot_ns
+    n_regions = len(compiled["offsets_region"])
+    forecasts = np.full((slots.max() + 1, n_regions), np.nan)
+    forecasts[slots, df["region"].to_numpy()] = predictions
+    return {"base_time": np.array(times.min(), dtype="datetime64[ns]"),
+            "slot_ns": np.int64(slot_ns),
+            "forecasts": forecasts}
+
+
+def forecast_slots(cache, timestamps):
+    # row of every timestamp in the cache, -1 outside of it or between slots
+    return slot_positions(cache["base_time"], cache["slot_ns"],
+                          len(cache["forecasts"]), timestamps)
+
+
+def cached_forecasts(cache, timestamp):
+    # regions and predictions of one slot, None when the slot is not cached
+    timestamp = np.datetime64(pd.Timestamp(timestamp), "ns")
+    slot = forecast_slots(cache, [timestamp])[0]
+    if slot < 0:
+        return None
+    forecasts = cache["forecasts"][slot]
+    regions = np.flatnonzero(~np.isnan(forecasts))
+    if len(regions) == 0:
+        return None
+    return regions, forecasts[regions]
+
+
+def save_forecast_cache(cache, save_path):
+    np.savez(save_path, **cache)
+
+
+def load_forecast_cache(cache_path):
+    with np.load(cache_path) as cache:
+        return {key: cache[key] for key in cache.files}
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+if __name__ == "__main__":
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent.parent
+
+    # read the features of the served horizon
+    feature_set = read_params()["serving"]["feature_set"]
+    df = load_features(features_path(root_path, feature_set))
+    logger.info("Data read successfully")
+
+    # load the compiled model
+    compiled = load_compiled_model(root_path / "models/compiled_model.npz")
+
+    # score every slot and region once
+    cache = materialize_forecasts(df, compiled)
+    logger.info(f"Forecasts materialized for {cache['forecasts'].shape[0]} "
+                "slots")
+
+    # save the cache
+    save_forecast_cache(cache, root_path / "models/forecast_cache.npz")
+    logger.info("Forecast cache saved successfully")
@@ -0,0 +1,210 @@
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from yaml import safe_load
+from src.features.demand_matrix import ewma_matrix, region_spans
+from src.features.feature_store import features_path, load_features
+from src.features.lag_features import dense_matrix, slots_per_week
+from src.features.slot_table import slot_positions
+from src.models.compiled_model import predict_compiled
+
+
+# create a logger
+logger = logging.getLogger("recursive_forecast")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+# nanoseconds per day, the epoch is a thursday
+day_ns = pd.Timedelta("1D").value
+epoch_day_of_week = 3
+
+
+def column_shift(column, freq="15min"):
+    # number of past slots a rolled forward feature looks back on
+    if column.startswith("lag_"):
+        return int(column[len("lag_"):])
+    if column.startswith("rolling_mean_"):
+        return int(column[len("rolling_mean_"):])
+    if column == "last_week_pickups":
+        return slots_per_week(freq)
+    raise ValueError(f"Column {column} can not be rolled forward")
+
+
+def window_features(window, columns, freq="15min"):
+    # features of the next slot from the trailing pickups, oldest first
+    features = {}
+    for column in columns:
+        shift = column_shift(column, freq)
+        if column.startswith("rolling_mean_"):
+            features[column] = window[:, -shift:].mean(axis=1)
+        else:
+            features[column] = window[:, -shift]
+    return features
+
+
+def model_history(compiled, freq="15min"):
+    # rolled forward feature columns of the model and the number of past
+    # slots they need
+    columns = [column for column in compiled["passthrough_columns"]
+               if column != "avg_pickups"]
+    history = max((column_shift(column, freq) for column in columns),
+                  default=0)
+    return columns, history
+
+
+def roll_forward(compiled, regions, origin_times, window, weighted, old_wt,
+                 steps, alpha, freq="15min"):
+    # forecasts of the next steps slots after the origin slot of every row,
+    # the predictions are fed back into the pickups window and the EWMA.
+    # avg_pickups of a training row includes the pickups of its own slot,
+    # ahead of time the latest known average is the one of the slot before
+    slot_ns = pd.Timedelta(freq).value
+    columns, history = model_history(compiled, freq)
+    window = np.asarray(window, dtype=np.float64)
+    if window.shape[1] < history:
+        raise ValueError(f"The model needs {history} past slots, "
+                         f"the window has {window.shape[1]}")
+
+    # rows without a full window or average have no forecast
+    window = window[:, window.shape[1] - history:]
+    weighted = np.asarray(weighted, dtype=np.float64)
+    valid = np.isfinite(window).all(axis=1) & np.isfinite(weighted)
+    regions = np.asarray(regions, dtype=np.int64)[valid]
+    times = np.asarray(origin_times, dtype="datetime64[ns]").view(np.int64)
+    times = times[valid]
+    weighted = weighted[valid]
+    old_wt = np.asarray(old_wt, dtype=np.float64)[valid]
+
+    # the window of every step is a view of one buffer the predictions are
+    # appended to
+    pickups = np.empty((len(regions), history + steps))
+    pickups[:, :history] = window[valid]
+    for step in range(steps):
+        times = times + slot_ns
+        features = window_features(pickups[:, step:step + history],
+                                   columns, freq)
+        features["avg_pickups"] = np.round(weighted)
+        features["region"] = regions
+        features["day_of_week"] = (times // day_ns + epoch_day_of_week) % 7
+        predictions = predict_compiled(compiled, features)
+
+        # same update as the EWMA of the resampled data
+        decayed = old_wt * (1 - alpha)
+        weighted = (decayed * weighted + predictions) / (decayed + 1)
+        old_wt = decayed + 1
+        pickups[:, history + step] = predictions
+
+    forecasts = np.full((len(valid), steps), np.nan)
+    forecasts[valid] = pickups[:, history:]
+    return forecasts
+
+
+def demand_state(resampled_data, alpha, freq="15min"):
+    # pickups and EWMA state after every slot of a table with region and
+    # total_pickups as dense (n_regions x n_slots) arrays. the EWMA starts
+    # with the first slot of the table, an earlier start fades out with
+    # (1 - alpha) per slot
+    matrix, _, _ = dense_matrix(resampled_data, freq=freq)
+    first, last = region_spans(~np.isnan(matrix))
+    weighted, _, _ = ewma_matrix(matrix, first, last, alpha)
+    # after n updates the weight is the sum of (1 - alpha)^k for k < n
+    updates = np.arange(matrix.shape[1]) - first[:, np.newaxis] + 1
+    old_wt = np.where(updates > 0,
+                      (1 - (1 - alpha) ** np.maximum(updates, 0)) / alpha,
+                      1.0)
+    times = resampled_data.index.to_numpy(dtype="datetime64[ns]")
+    return {"base_time": np.array(times.min(), dtype="datetime64[ns]"),
+            "slot_ns": np.int64(pd.Timedelta(freq).value),
+            "pickups": matrix,
+            "weighted": weighted,
+            "old_wt": old_wt,
+            "alpha": np.float64(alpha)}
+
+
+def forecast_from_state(compiled, state, origin_times, steps):
+    # (n_origins x n_regions x steps) forecasts of all regions for the slots
+    # after every origin slot, NaN where the state has no full history. the
+    # window is as long as the longest lag of the model
+    n_regions, n_slots = state["pickups"].shape
+    freq = pd.Timedelta(int(state["slot_ns"]))
+    _, history = model_history(compiled, freq)
+    origins = slot_positions(state["base_time"], state["slot_ns"], n_slots,
+                             origin_times)
+    padded = np.concatenate([np.full((n_regions, history), np.nan),
+                             state["pickups"]], axis=1)
+    # origins outside of the state (-1) read the all NaN padding
+    positions = origins[:, np.newaxis] + 1 + np.arange(history)
+    window = padded[:, positions].transpose(1, 0, 2)
+    weighted = np.where(origins >= 0, state["weighted"][:, origins], np.nan).T
+    old_wt = state["old_wt"][:, origins].T
+    origin_times = np.asarray(origin_times, dtype="datetime64[ns]")
+    forecasts = roll_forward(compiled,
+                             np.tile(np.arange(n_regions), len(origins)),
+                             np.repeat(origin_times, n_regions),
+                             window.reshape(-1, history),
+                             weighted.ravel(),
+                             old_wt.ravel(),
+                             steps,
+                             state["alpha"],
+                             freq=freq)
+    return forecasts.reshape(len(origins), n_regions, steps)
+
+
+def forecast_from_checkpoint(compiled, checkpoint, steps):
+    # (n_regions x steps) forecasts for the slots after the last slot of
+    # every region in the feature checkpoint
+    n_regions = len(checkpoint["last_time"])
+    return roll_forward(compiled,
+                        np.arange(n_regions),
+                        checkpoint["last_time"],
+                        checkpoint["recent_pickups"],
+                        checkpoint["weighted"],
+                        checkpoint["old_wt"],
+                        steps,
+                        checkpoint["alpha"])
+
+
+def save_demand_state(state, save_path):
+    np.savez(save_path, **state)
+
+
+def load_demand_state(state_path):
+    with np.load(state_path) as state:
+        return {key: state[key] for key in state.files}
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+if __name__ == "__main__":
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent.parent
+    params = read_params()
+
+    # read the features of the served horizon
+    feature_set = params["serving"]["feature_set"]
+    df = load_features(features_path(root_path, feature_set))
+    logger.info("Data read successfully")
+
+    # pickups and EWMA state to roll the forecasts forward from
+    state = demand_state(df, params["extract_features"]["ewma"]["alpha"])
+    logger.info(f"Demand state built for {state['pickups'].shape[1]} slots")
+
+    # save the state
+    save_demand_state(state, root_path / "models/demand_state.npz")
+    logger.info("Demand state saved successfully")
@@ -1,15 +1,7 @@
 import json
-import mlflow
-import dagshub
 import logging
 from pathlib import Path
-from mlflow.client import MlflowClient
-
-import dagshub
-dagshub.init(repo_owner='MohammoD2', repo_name='Uber_Demand_Pridiction-', mlflow=True)
-
-# set the mlflow tracking uri
-mlflow.set_tracking_uri("https://dagshub.com/MohammoD2/Uber_Demand_Pridiction-.mlflow")
+from src.models.tracking import init_tracking
 
 # create a logger
 logger = logging.getLogger("register_model")
@@ -44,6 +36,8 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
     
+    mlflow = init_tracking()
+    
     # register the model
     model_name = "uber_demand_prediction_model"
     model_uri = run_info["model_uri"]
@@ -57,7 +51,7 @@ if __name__ == "__main__":
     # move the registered model to staging stage
     model_stage = "Staging"
     
-    client = MlflowClient()
+    client = mlflow.MlflowClient()
     
     stage_version = client.transition_model_version_stage(name=model_name,
                                           version=model_version,
@@ -0,0 +1,75 @@
+import numpy as np
+from scipy import sparse
+from sklearn.linear_model import LinearRegression
+
+
+def encoded_columns(encoder):
+    # one hot and passthrough columns of the fitted ColumnTransformer in
+    # the order of its output
+    ohe = encoder.named_transformers_["ohe"]
+    remainder = [columns for name, _, columns in encoder.transformers_
+                 if name == "remainder"]
+    return ohe, list(remainder[0]) if remainder else []
+
+
+def design_matrix(X, encoder):
+    # CSR matrix with the same columns as encoder.transform(X), the one
+    # hot blocks hold a single non zero per row
+    ohe, passthrough = encoded_columns(encoder)
+    n_rows = len(X)
+    drop_idxs = ohe.drop_idx_
+    if drop_idxs is None:
+        drop_idxs = [None] * len(ohe.categories_)
+    blocks = []
+    for column, categories, drop_idx in zip(ohe.feature_names_in_,
+                                            ohe.categories_, drop_idxs):
+        values = X[column].to_numpy()
+        codes = np.searchsorted(categories, values)
+        codes = codes.clip(0, len(categories) - 1)
+        if not np.array_equal(categories[codes], values):
+            raise ValueError(f"Found unknown categories in column {column}")
+        one_hot = sparse.csr_matrix(
+            (np.ones(n_rows), (np.arange(n_rows), codes)),
+            shape=(n_rows, len(categories)))
+        if drop_idx is not None:
+            kept = np.delete(np.arange(len(categories)), drop_idx)
+            one_hot = one_hot[:, kept]
+        blocks.append(one_hot)
+    blocks.append(sparse.csr_matrix(X[passthrough].to_numpy(dtype=np.float64)))
+    return sparse.hstack(blocks, format="csr")
+
+
+def iter_row_chunks(X, y, chunksize=100000):
+    for start in range(0, len(X), chunksize):
+        yield X.iloc[start:start + chunksize], y.iloc[start:start + chunksize]
+
+
+def accumulate_normal_equations(chunks, encoder):
+    # XᵀX and Xᵀy of the design matrix with a leading intercept column,
+    # memory is quadratic in the features and independent of the rows
+    gram, moment = None, None
+    for X, y in chunks:
+        design = sparse.hstack([np.ones((len(X), 1)),
+                                design_matrix(X, encoder)], format="csr")
+        chunk_gram = (design.T @ design).toarray()
+        chunk_moment = design.T @ y.to_numpy(dtype=np.float64)
+        gram = chunk_gram if gram is None else gram + chunk_gram
+        moment = chunk_moment if moment is None else moment + chunk_moment
+    return gram, moment
+
+
+def solve_normal_equations(gram, moment):
+    # least squares solution, lstsq also copes with collinear columns
+    solution = np.linalg.lstsq(gram, moment, rcond=None)[0]
+    return solution[1:], solution[0]
+
+
+def linear_regression(coef, intercept, feature_names):
+    # fitted LinearRegression with the given solution, predicts on the
+    # dense output of the encoder like a model trained with fit
+    model = LinearRegression()
+    model.coef_ = np.asarray(coef, dtype=np.float64)
+    model.intercept_ = float(intercept)
+    model.n_features_in_ = len(feature_names)
+    model.feature_names_in_ = np.asarray(feature_names, dtype=object)
+    return model
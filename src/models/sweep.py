@@ -0,0 +1,150 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from joblib import Parallel, delayed
+from yaml import safe_load
+from sklearn.metrics import mean_absolute_percentage_error
+from src.memory_usage import reset_peak_rss, measured_peak_rss_mb
+from src.features.demand_matrix import count_matrix, region_spans, demand_frame
+from src.features.extract_features import (load_cluster_cache, fit_scaler,
+                                           fit_kmeans)
+from src.features.feature_processing import process_features
+from src.features.lag_features import required_history
+from src.features.region_grid import build_region_grid, lookup_regions
+from src.models.train import train_model
+from src.models.compiled_model import compile_model, predict_compiled
+
+
+# create a logger
+logger = logging.getLogger("sweep")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+
+def cached_regions(coordinates, grid, chunksize=1000000):
+    # region of every cached pickup, looked up chunk wise from the grid
+    regions = np.empty(len(coordinates), dtype=np.int16)
+    for start in range(0, len(coordinates), chunksize):
+        chunk = slice(start, start + chunksize)
+        regions[chunk] = lookup_regions(grid, coordinates[chunk])
+    return regions
+
+
+def evaluate_alpha(counts, base_time, alpha, params):
+    # demand features of one alpha on the shared counts, trained and scored
+    # like the train and evaluate stages
+    first, last = region_spans(counts)
+    history = required_history(**params["feature_processing"]["features"])
+    resampled_data, _ = demand_frame(counts, base_time, first, last, alpha,
+                                     history=history)
+    trainset, testset = process_features(resampled_data, params)
+    encoder, model = train_model(trainset, **params["train"])
+    y_pred = predict_compiled(compile_model(encoder, model),
+                              testset.drop(columns=["total_pickups"]))
+    return mean_absolute_percentage_error(testset["total_pickups"], y_pred)
+
+
+def cluster_counts(cache_dir, scaler, n_clusters, params):
+    # the regions and counts only depend on n_clusters, so they are built
+    # once per n_clusters and shared by the trials of every alpha. the
+    # worker maps the cache itself, only the path and the fitted scaler are
+    # sent. the peak RSS is reset for every task, the workers are reused by
+    # joblib
+    reset = reset_peak_rss()
+    start_time = time.perf_counter()
+    coordinates, pickup_times = load_cluster_cache(cache_dir)
+    mini_batch_params = {**params["extract_features"]["mini_batch_kmeans"],
+                         "n_clusters": n_clusters}
+    mini_batch = fit_kmeans(coordinates, scaler, mini_batch_params)
+    grid = build_region_grid(scaler, mini_batch, **params["region_grid"])
+    counts, base_time = count_matrix(pickup_times,
+                                     cached_regions(coordinates, grid),
+                                     n_clusters)
+    return {"n_clusters": n_clusters,
+            "counts": counts,
+            "base_time": base_time,
+            "cluster_seconds": round(time.perf_counter() - start_time, 3),
+            "cluster_peak_rss_mb": measured_peak_rss_mb(reset)}
+
+
+def run_trial(clusters, alpha, params):
+    # one (n_clusters, alpha) combination on the counts of its n_clusters
+    reset = reset_peak_rss()
+    start_time = time.perf_counter()
+    loss = evaluate_alpha(clusters["counts"], clusters["base_time"], alpha,
+                          params)
+    logger.info(f"n_clusters={clusters['n_clusters']} alpha={alpha}: "
+                f"MAPE {loss:.4f}")
+    return {"n_clusters": clusters["n_clusters"],
+            "alpha": alpha,
+            "MAPE": loss,
+            "cluster_seconds": clusters["cluster_seconds"],
+            "cluster_peak_rss_mb": clusters["cluster_peak_rss_mb"],
+            "seconds": round(time.perf_counter() - start_time, 3),
+            "peak_rss_mb": measured_peak_rss_mb(reset)}
+
+
+def sweep(cache_dir, params, n_clusters_grid, alpha_grid, n_jobs=-1):
+    # ranked table of every (n_clusters, alpha) combination, the scaler does
+    # not depend on either and is fitted once for all trials. the counts of
+    # every n_clusters are built in parallel first, then the whole grid of
+    # combinations runs in parallel on them
+    coordinates, _ = load_cluster_cache(cache_dir)
+    scaler = fit_scaler(coordinates)
+    logger.info("Scaler trained successfully")
+
+    with Parallel(n_jobs=n_jobs) as parallel:
+        clusters = parallel(
+            delayed(cluster_counts)(cache_dir, scaler, n_clusters, params)
+            for n_clusters in n_clusters_grid)
+        trials = parallel(delayed(run_trial)(cluster, alpha, params)
+                          for cluster in clusters for alpha in alpha_grid)
+    results = pd.DataFrame(trials)
+    results = results.sort_values("MAPE", ignore_index=True)
+    results.index.name = "rank"
+    return results
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+if __name__ == "__main__":
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent.parent
+    params = read_params()
+    sweep_params = params["sweep"]
+
+    # the cluster cache of the extract_features stage is shared by all trials
+    cache_dir = root_path / "data/interim/cluster_cache"
+    n_combinations = (len(sweep_params["n_clusters"]) *
+                      len(sweep_params["alpha"]))
+    logger.info(f"Sweeping {n_combinations} combinations")
+
+    start_time = time.perf_counter()
+    results = sweep(cache_dir, params,
+                    sweep_params["n_clusters"], sweep_params["alpha"],
+                    n_jobs=sweep_params["n_jobs"])
+    logger.info(f"Sweep finished in {time.perf_counter() - start_time:.2f} s")
+
+    # save the ranked table
+    save_path = root_path / "reports/sweep_results.csv"
+    results.to_csv(save_path)
+    best = results.loc[0]
+    logger.info(f"Best combination: n_clusters={best['n_clusters']} "
+                f"alpha={best['alpha']} with MAPE {best['MAPE']:.4f}")
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+# create a logger
+logger = logging.getLogger("tracking")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+# local file store next to the code
+root_path = Path(__file__).parent.parent.parent
+local_store = root_path / "mlruns"
+
+# the remote tracking server on dagshub
+remote_repo_owner = "MohammoD2"
+remote_repo_name = "Uber_Demand_Pridiction-"
+remote_tracking_uri = (f"https://dagshub.com/{remote_repo_owner}/"
+                       f"{remote_repo_name}.mlflow")
+
+# tag of a local run that was copied to the remote
+remote_run_tag = "remote_run_id"
+
+
+def tracking_backend():
+    return os.environ.get("TRACKING_BACKEND", "local")
+
+
+def init_tracking(backend=None):
+    """mlflow set up for the local file store unless TRACKING_BACKEND=dagshub,
+    nothing touches the network unless the dagshub backend is asked for."""
+    import mlflow
+    backend = backend or tracking_backend()
+    if backend == "local":
+        mlflow.set_tracking_uri(local_store.as_uri())
+    elif backend == "dagshub":
+        import dagshub
+        dagshub.init(repo_owner=remote_repo_owner,
+                     repo_name=remote_repo_name,
+                     mlflow=True)
+        mlflow.set_tracking_uri(remote_tracking_uri)
+    else:
+        raise ValueError(f"Unknown tracking backend {backend}")
+    logger.info(f"Tracking with the {backend} backend at "
+                f"{mlflow.get_tracking_uri()}")
+    return mlflow
+
+
+class BackgroundRun:
+    # the logging calls of one run are queued to a single worker thread so
+    # the stage goes on while they reach the store, close waits for them and
+    # raises the first failed call
+
+    def __init__(self, mlflow, experiment_id, run_name=None):
+        self.mlflow = mlflow
+        self.client = mlflow.MlflowClient()
+        run = self.client.create_run(experiment_id, run_name=run_name)
+        self.run_id = run.info.run_id
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = []
+
+    def submit(self, fn, *args, **kwargs):
+        # fn runs on the worker thread with the run active there
+        def call():
+            with self.mlflow.start_run(run_id=self.run_id):
+                return fn(*args, **kwargs)
+        future = self.executor.submit(call)
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        try:
+            for future in self.futures:
+                future.result()
+        finally:
+            self.executor.shutdown(wait=True)
+        self.client.set_terminated(self.run_id)
+
+
+def run_artifact_path(source, run):
+    # path of a model version source inside the artifacts of its run
+    for prefix in (run.info.artifact_uri, f"runs:/{run.info.run_id}"):
+        if source.startswith(prefix):
+            return source[len(prefix):].strip("/")
+    return None
+
+
+def sync_model_versions(local, remote, run, remote_run_id):
+    # the registry entries of a local run are registered again on the
+    # remote from the copied artifacts, in the same stage
+    from mlflow.exceptions import MlflowException
+    remote_artifact_uri = remote.get_run(remote_run_id).info.artifact_uri
+    versions = local.search_model_versions(f"run_id='{run.info.run_id}'")
+    for version in versions:
+        artifact_path = run_artifact_path(version.source, run)
+        if artifact_path is None:
+            logger.warning(f"Model {version.name} version {version.version} "
+                           "is not stored in its run, not synced")
+            continue
+        try:
+            remote.create_registered_model(version.name)
+        except MlflowException:
+            # the model is already registered on the remote
+            pass
+        remote_version = remote.create_model_version(
+            version.name, f"{remote_artifact_uri}/{artifact_path}",
+            run_id=remote_run_id)
+        if version.current_stage != "None":
+            remote.transition_model_version_stage(
+                version.name, remote_version.version, version.current_stage)
+        logger.info(f"Model {version.name} version {version.version} "
+                    f"registered as version {remote_version.version}")
+
+
+def sync_runs(experiment_name, backend="dagshub"):
+    # copy the local runs of an experiment that are not on the remote yet,
+    # with their params, metric histories, tags, artifacts and registered
+    # model versions. returns the remote run id of every copied run
+    import mlflow
+    from mlflow.entities import Param
+    local = mlflow.MlflowClient(tracking_uri=local_store.as_uri(),
+                                registry_uri=local_store.as_uri())
+    experiment = local.get_experiment_by_name(experiment_name)
+    if experiment is None:
+        return {}
+    runs = [run for run in local.search_runs([experiment.experiment_id])
+            if remote_run_tag not in run.data.tags]
+
+    init_tracking(backend)
+    remote = mlflow.MlflowClient()
+    remote_experiment_id = mlflow.set_experiment(experiment_name).experiment_id
+    synced = {}
+    for run in runs:
+        run_id = run.info.run_id
+        tags = {key: value for key, value in run.data.tags.items()
+                if not key.startswith("mlflow.")}
+        remote_run = remote.create_run(remote_experiment_id,
+                                       start_time=run.info.start_time,
+                                       tags=tags,
+                                       run_name=run.info.run_name)
+        remote_run_id = remote_run.info.run_id
+        metrics = [metric for key in run.data.metrics
+                   for metric in local.get_metric_history(run_id, key)]
+        params = [Param(key, value) for key, value in run.data.params.items()]
+        remote.log_batch(remote_run_id, metrics=metrics, params=params)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            remote.log_artifacts(remote_run_id,
+                                 local.download_artifacts(run_id, "", tmp_dir))
+        remote.set_terminated(remote_run_id, status=run.info.status,
+                              end_time=run.info.end_time)
+        sync_model_versions(local, remote, run, remote_run_id)
+        local.set_tag(run_id, remote_run_tag, remote_run_id)
+        synced[run_id] = remote_run_id
+        logger.info(f"Run {run_id} synced as {remote_run_id}")
+    return synced
+
+
+if __name__ == "__main__":
+    # sync the local runs of the dvc pipeline, e.g.
+    # python -m src.models.tracking sync
+    if sys.argv[1:] != ["sync"]:
+        raise SystemExit("usage: python -m src.models.tracking sync")
+    synced = sync_runs("DVC Pipeline")
+    logger.info(f"{len(synced)} runs synced to the remote")
+
+    # point the run information at the remote copy of its run
+    run_information_path = root_path / "run_information.json"
+    if run_information_path.exists():
+        with open(run_information_path, "r") as f:
+            run_information = json.load(f)
+        if run_information["run_id"] in synced:
+            remote_run_id = synced[run_information["run_id"]]
+            model_uri = run_information["model_uri"]
+            run_information["model_uri"] = model_uri.replace(
+                run_information["run_id"], remote_run_id)
+            run_information["run_id"] = remote_run_id
+            with open(run_information_path, "w") as f:
+                json.dump(run_information, f, indent=4)
+            logger.info("Run information points at the remote run")
@@ -1,11 +1,19 @@
-import pandas as pd
 import joblib
 import logging
+import numpy as np
 from pathlib import Path
 from sklearn.linear_model import LinearRegression
 from sklearn import set_config
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
+from yaml import safe_load
+from src.features.feature_store import (features_path, load_features,
+                                        iter_features)
+from src.models.compiled_model import compile_model, save_compiled_model
+from src.models.sparse_linear import (iter_row_chunks,
+                                      accumulate_normal_equations,
+                                      solve_normal_equations,
+                                      linear_regression)
 
 
 set_config(transform_output="pandas")
@@ -23,6 +31,84 @@ logger.addHandler(handler)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 
+# columns of the one hot encoder
+categorical_columns = ["region", "day_of_week"]
+
+
+def make_encoder(categories="auto"):
+    # make the transformer
+    encoder = ColumnTransformer([
+        ("ohe", OneHotEncoder(drop="first", sparse_output=False,
+                              categories=categories), categorical_columns)
+        ], remainder="passthrough", n_jobs=-1,force_int_remainder_cols=False)
+    return encoder
+
+
+def solve_linear_model(chunks, encoder, solver="normal_equations"):
+    if solver == "normal_equations":
+        # accumulate XᵀX and Xᵀy over sparse chunks of the design matrix
+        gram, moment = accumulate_normal_equations(chunks, encoder)
+        coef, intercept = solve_normal_equations(gram, moment)
+    else:
+        raise ValueError(f"Unknown solver {solver}")
+    return linear_regression(coef, intercept, encoder.get_feature_names_out())
+
+
+def train_model(df, solver="normal_equations", chunksize=100000):
+    # make X_train and y_train
+    X_train = df.drop(columns=["total_pickups"])
+    y_train = df["total_pickups"]
+    
+    # fit the transformer once, it only learns the categories
+    encoder = make_encoder()
+    encoder.fit(X_train)
+    
+    if solver == "dense":
+        # encode the training data
+        X_train_encoded = encoder.transform(X_train)
+        logger.info("Data encoded successfully")
+        
+        # train the model
+        lr = LinearRegression()
+
+        # fit on the training data
+        lr.fit(X_train_encoded, y_train)
+    else:
+        chunks = iter_row_chunks(X_train, y_train, chunksize)
+        lr = solve_linear_model(chunks, encoder, solver=solver)
+    logger.info("Model trained successfully")
+    return encoder, lr
+
+
+def train_model_from_file(data_path, solver="normal_equations",
+                          chunksize=100000):
+    # out of core training, the feature table is read chunk by chunk and
+    # only the sufficient statistics of the linear model are kept
+    if solver == "dense":
+        return train_model(load_features(data_path), solver=solver,
+                           chunksize=chunksize)
+    
+    # the categories come from the two small integer columns
+    categories = load_features(data_path, columns=categorical_columns)
+    encoder = make_encoder(categories=[np.unique(categories[column])
+                                       for column in categorical_columns])
+    # fit the transformer on the first chunk for the column layout
+    first_chunk = next(iter_features(data_path, chunksize=chunksize))
+    encoder.fit(first_chunk.drop(columns=["total_pickups"]))
+    
+    chunks = ((chunk.drop(columns=["total_pickups"]), chunk["total_pickups"])
+              for chunk in iter_features(data_path, chunksize=chunksize))
+    lr = solve_linear_model(chunks, encoder, solver=solver)
+    logger.info("Model trained successfully")
+    return encoder, lr
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
 def save_model(model, save_path):
     joblib.dump(model, save_path)
     
@@ -33,44 +119,22 @@ if __name__ == "__main__":
     # set the root path
     root_path = current_path.parent.parent.parent
     # data_path
-    data_path = root_path / "data/processed/train.csv"
-    
-    # read the data
-    df = pd.read_csv(data_path, parse_dates=["tpep_pickup_datetime"])
-    logger.info("Data read successfully")
+    data_path = features_path(root_path, "train")
     
-    # set the datetime column as index
-    df.set_index("tpep_pickup_datetime", inplace=True)
-    
-    # make X_train and y_train
-    X_train = df.drop(columns=["total_pickups"])
-    y_train = df["total_pickups"]
-    
-    # make the transformer
-    encoder = ColumnTransformer([
-        ("ohe", OneHotEncoder(drop="first",sparse_output=False), ["region","day_of_week"])
-        ], remainder="passthrough", n_jobs=-1,force_int_remainder_cols=False)
-        
-    # fit the transformer
-    encoder.fit(X_train)
+    # fit the transformer and the model on the chunks of the data
+    encoder, lr = train_model_from_file(data_path, **read_params()["train"])
     
     # save the transformer
     encoder_save_path = root_path / "models/encoder.joblib"
-    joblib.dump(encoder, encoder_save_path)
+    save_model(encoder, encoder_save_path)
     logger.info("Encoder saved successfully")
     
-    # encode the training data
-    X_train_encoded = encoder.fit_transform(X_train)
-    logger.info("Data encoded successfully")
-    
-    # train the model
-    lr = LinearRegression()
-
-    # fit on the training data
-    lr.fit(X_train_encoded, y_train)
-    logger.info("Model trained successfully")
-    
     # save the model
     model_save_path = root_path / "models/model.joblib"
     save_model(lr, model_save_path)
-    logger.info("Model saved successfully")
\ No newline at end of file
+    logger.info("Model saved successfully")
+    
+    # save the lookup table form of the encoder and model for serving
+    compiled_save_path = root_path / "models/compiled_model.npz"
+    save_compiled_model(compile_model(encoder, lr), compiled_save_path)
+    logger.info("Compiled model saved successfully")
@@ -0,0 +1,163 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from yaml import safe_load
+from src.memory_usage import reset_peak_rss, measured_peak_rss_mb
+from src.data.data_ingestion import (raw_file_names, read_raw_data,
+                                     streamed_partitions)
+from src.features.extract_features import (write_cluster_cache,
+                                           extract_features, save_model)
+from src.features.region_grid import save_region_grid
+from src.features.region_polygons import (build_region_polygons,
+                                          save_region_polygons)
+from src.features.demand_matrix import save_checkpoint
+from src.features.feature_processing import process_features
+from src.features.feature_store import features_path, save_features
+from src.models.train import train_model
+from src.models.evaluate import (evaluate_model, error_breakdown,
+                                 save_error_breakdown)
+from src.models.compiled_model import compile_model, save_compiled_model
+from src.models.forecast_cache import (materialize_forecasts,
+                                       save_forecast_cache)
+from src.models.recursive_forecast import demand_state, save_demand_state
+
+
+# create a logger
+logger = logging.getLogger("run_pipeline")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+@contextmanager
+def timed_stage(name, report):
+    # the peak RSS is reset for every stage, so it is the peak of the
+    # process while the stage ran, including the writes still running in
+    # the background
+    reset = reset_peak_rss()
+    start_time = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start_time
+    peak_rss = measured_peak_rss_mb(reset)
+    report.append({"stage": name,
+                   "seconds": round(elapsed, 3),
+                   "peak_rss_mb": peak_rss})
+    logger.info(f"Stage {name} finished in {elapsed:.2f} s, "
+                f"peak RSS {peak_rss:.0f} MB")
+
+
+if __name__ == "__main__":
+    # current path
+    current_path = Path(__file__)
+    # set the root path
+    root_path = current_path.parent.parent
+    params = read_params()
+    ingestion_params = params["data_ingestion"]
+    export_csv = params["feature_store"]["export_csv"]
+    models_dir = root_path / "models"
+    processed_dir = root_path / "data/processed"
+
+    # the stage outputs are written by one background thread while the
+    # next stage works on the objects in memory
+    report = []
+    writer = ThreadPoolExecutor(max_workers=1)
+    writes = []
+
+    with timed_stage("data_ingestion", report):
+        # read the data without outliers
+        raw_paths = [root_path / "data/raw" / name for name in raw_file_names]
+        df = read_raw_data(raw_paths, ingestion_params)
+        # the interim data is written in the streamed part layout, the
+        # same parallel windows as the data_ingestion stage
+        chunks = streamed_partitions(
+            df, root_path / "data/interim/df_without_outliers",
+            file_format=ingestion_params["file_format"],
+            max_in_flight=ingestion_params["streaming"]["max_in_flight"])
+        # cache the data for clustering from the same pass
+        cache_dir = root_path / "data/interim/cluster_cache"
+        write_cluster_cache(chunks, cache_dir)
+        logger.info("Data ingested and cached successfully")
+
+    with timed_stage("extract_features", report):
+        (scaler, mini_batch, grid,
+         resampled_data, checkpoint) = extract_features(cache_dir, params)
+        region_polygons = build_region_polygons(scaler, mini_batch)
+        writes += [
+            writer.submit(save_model, scaler, models_dir / "scaler.joblib"),
+            writer.submit(save_model, mini_batch,
+                          models_dir / "mb_kmeans.joblib"),
+            writer.submit(save_region_grid, grid,
+                          models_dir / "region_grid.npz"),
+            writer.submit(save_region_polygons, region_polygons,
+                          models_dir / "region_polygons.geojson"),
+            writer.submit(resampled_data.to_csv,
+                          processed_dir / "resampled_data.csv", index=True),
+            writer.submit(save_checkpoint, checkpoint,
+                          processed_dir / "feature_checkpoint.npz")]
+
+    with timed_stage("feature_processing", report):
+        trainset, testset = process_features(resampled_data, params)
+        writes += [writer.submit(save_features, trainset,
+                                 features_path(root_path, "train"),
+                                 export_csv=export_csv),
+                   writer.submit(save_features, testset,
+                                 features_path(root_path, "test"),
+                                 export_csv=export_csv)]
+
+    with timed_stage("train", report):
+        encoder, lr = train_model(trainset, **params["train"])
+        compiled = compile_model(encoder, lr)
+        writes += [writer.submit(save_model, encoder,
+                                 models_dir / "encoder.joblib"),
+                   writer.submit(save_model, lr, models_dir / "model.joblib"),
+                   writer.submit(save_compiled_model, compiled,
+                                 models_dir / "compiled_model.npz")]
+
+    with timed_stage("materialize_forecasts", report):
+        cache = materialize_forecasts(testset, compiled)
+        writes.append(writer.submit(save_forecast_cache, cache,
+                                    models_dir / "forecast_cache.npz"))
+        state = demand_state(testset,
+                             params["extract_features"]["ewma"]["alpha"])
+        writes.append(writer.submit(save_demand_state, state,
+                                    models_dir / "demand_state.npz"))
+
+    with timed_stage("evaluate", report):
+        # the mlflow logging stays with the evaluate stage of dvc
+        loss, _, y_pred = evaluate_model(testset, encoder, lr)
+        breakdown = error_breakdown(testset, y_pred)
+        breakdown_path = root_path / "reports/error_breakdown.json"
+        writes.append(writer.submit(save_error_breakdown, breakdown,
+                                    breakdown_path))
+
+    with timed_stage("persist", report):
+        # wait for the outputs and raise the first failed write
+        for future in writes:
+            future.result()
+        writer.shutdown(wait=True)
+        logger.info("Stage outputs saved successfully")
+
+    # save the timings
+    report_path = root_path / "reports/pipeline_timings.json"
+    with open(report_path, "w") as f:
+        json.dump({"MAPE": loss, "stages": report}, f, indent=4)
+    for row in report:
+        logger.info(f"{row['stage']:<20}{row['seconds']:>10.2f} s"
+                    f"{row['peak_rss_mb']:>10.0f} MB")
@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+
+# create a logger
+logger = logging.getLogger("artifact_cache")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+
+def file_signature(path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ArtifactCache:
+    # loads every artifact once per process and reloads it when the file
+    # changes, the new version replaces the old one only after it loaded
+    # completely so readers always see a whole artifact
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.timings = {}
+
+    def get(self, name, path, loader, optional=False):
+        path = Path(path)
+        if optional and not path.exists():
+            return None
+        signature = file_signature(path)
+        entry = self.entries.get(name)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        with self.lock:
+            # another thread may have loaded it while we waited
+            entry = self.entries.get(name)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+            start_time = time.perf_counter()
+            try:
+                value = loader(path)
+            except Exception:
+                # a file still being written keeps the previous version
+                if entry is None:
+                    raise
+                logger.warning(f"Reloading {name} failed, serving the "
+                               "previous version", exc_info=True)
+                return entry[1]
+            elapsed = time.perf_counter() - start_time
+            self.entries[name] = (signature, value)
+            loads = self.timings.get(name, {}).get("loads", 0) + 1
+            self.timings[name] = {"path": str(path),
+                                  "seconds": elapsed,
+                                  "loads": loads}
+            logger.info(f"{name} loaded from {path} in "
+                        f"{elapsed * 1000:.1f} ms")
+        return value
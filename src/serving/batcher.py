@@ -0,0 +1,71 @@
+import asyncio
+
+
+class MicroBatcher:
+    # coalesces concurrent submissions into one call of predict_batch, a
+    # batch is closed when it is full or max_wait_ms after its first item
+
+    def __init__(self, predict_batch, max_batch_size=256, max_wait_ms=2.0):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def collect(self):
+        # wait for the first item, then fill the batch until the deadline
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self.collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.predict_batch(items)
+            except Exception:
+                # one bad item must not fail the others, the batch is
+                # scored item by item and only the failing items raise
+                for item, future in batch:
+                    self.resolve(future, lambda: self.predict_batch([item])[0])
+                continue
+            for (_, future), result in zip(batch, results):
+                self.resolve(future, lambda: result)
+
+    @staticmethod
+    def resolve(future, compute):
+        # the client may have gone away in the meantime
+        if future.done():
+            return
+        try:
+            future.set_result(compute())
+        except Exception as error:
+            future.set_exception(error)
@@ -0,0 +1,226 @@
+import joblib
+import logging
+import numpy as np
+import pandas as pd
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field, model_validator
+from yaml import safe_load
+from src.features.region_grid import (build_region_grid, load_region_grid,
+                                      lookup_regions)
+from src.features.feature_store import features_path, load_features
+from src.features.slot_table import build_slot_table, table_slots, gather_rows
+from src.models.compiled_model import (compile_model, load_compiled_model,
+                                       predict_compiled)
+from src.models.forecast_cache import load_forecast_cache, forecast_slots
+from src.serving.batcher import MicroBatcher
+
+
+# create a logger
+logger = logging.getLogger("prediction_service")
+logger.setLevel(logging.INFO)
+
+# attach a console handler
+handler = logging.StreamHandler()
+handler.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# make a formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+handler.setFormatter(formatter)
+
+# root of the repository, the artifacts are read relative to it
+root_path = Path(__file__).parent.parent.parent
+
+# the trip times of the data are local new york times
+local_timezone = "America/New_York"
+
+
+class PredictRequest(BaseModel):
+    timestamp: datetime
+    region: Optional[int] = Field(default=None, ge=0,
+                                  le=np.iinfo(np.int32).max)
+    latitude: Optional[float] = Field(default=None, allow_inf_nan=False)
+    longitude: Optional[float] = Field(default=None, allow_inf_nan=False)
+
+    @model_validator(mode="after")
+    def check_location(self):
+        has_location = (self.latitude is not None and
+                        self.longitude is not None)
+        if self.region is None and not has_location:
+            raise ValueError("Either region or latitude and longitude are "
+                             "required")
+        if has_location:
+            # the regions are only fitted inside the inlier box, a location
+            # outside of it would get the forecast of the nearest region
+            from src.data.data_ingestion import (min_latitude, max_latitude,
+                                                 min_longitude, max_longitude)
+            if not (min_latitude <= self.latitude <= max_latitude and
+                    min_longitude <= self.longitude <= max_longitude):
+                raise ValueError(f"The location is outside of the served "
+                                 f"area, latitude must be within "
+                                 f"[{min_latitude}, {max_latitude}] and "
+                                 f"longitude within [{min_longitude}, "
+                                 f"{max_longitude}]")
+        return self
+
+
+class PredictResponse(BaseModel):
+    timestamp: datetime
+    region: int
+    predicted_pickups: float
+
+
+def read_params(params_path="params.yaml"):
+    with open(params_path, "r") as file:
+        params = safe_load(file)
+    return params
+
+
+def load_serving_artifacts(root_path, feature_set="test",
+                           cell_size=0.0005):
+    # the precomputed artifacts are used when present, otherwise they are
+    # derived from the joblib models of the pipeline
+    models_dir = root_path / "models"
+    grid_path = models_dir / "region_grid.npz"
+    if grid_path.exists():
+        grid = load_region_grid(grid_path)
+    else:
+        grid = build_region_grid(joblib.load(models_dir / "scaler.joblib"),
+                                 joblib.load(models_dir / "mb_kmeans.joblib"),
+                                 cell_size=cell_size)
+    compiled_path = models_dir / "compiled_model.npz"
+    if compiled_path.exists():
+        compiled = load_compiled_model(compiled_path)
+    else:
+        compiled = compile_model(joblib.load(models_dir / "encoder.joblib"),
+                                 joblib.load(models_dir / "model.joblib"))
+
+    # the materialized forecasts answer most requests without the model
+    cache_path = models_dir / "forecast_cache.npz"
+    forecast_cache = None
+    if cache_path.exists():
+        forecast_cache = load_forecast_cache(cache_path)
+
+    # the features of every (slot, region) as a dense array
+    n_regions = len(compiled["offsets_region"])
+    features = load_features(features_path(root_path, feature_set))
+    slot_table = build_slot_table(features, n_regions=n_regions)
+    return {"grid": grid, "compiled": compiled, "slot_table": slot_table,
+            "n_regions": n_regions, "forecast_cache": forecast_cache}
+
+
+def local_time(timestamp):
+    # timestamps with an offset are converted to new york time, naive ones
+    # are taken as new york time already
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.tz_convert(local_timezone).tz_localize(None)
+
+
+def request_slots(timestamps, freq="15min"):
+    # demand is served for the slot 15 minutes ahead of the request
+    local_times = pd.DatetimeIndex([local_time(timestamp)
+                                    for timestamp in timestamps])
+    return (local_times + pd.Timedelta(freq)).floor(freq)
+
+
+def predict_requests(artifacts, requests):
+    # one vectorized region lookup, cache lookup, feature gather and
+    # predict call for the whole batch, requests without features get a
+    # None prediction
+    slots = request_slots([request.timestamp for request in requests])
+    needs_lookup = np.array([request.region is None for request in requests],
+                            dtype=bool)
+    regions = np.array([0 if lookup else request.region
+                        for request, lookup in zip(requests, needs_lookup)],
+                       dtype=np.int64)
+    if needs_lookup.any():
+        coordinates = np.array(
+            [[request.longitude, request.latitude]
+             for request, lookup in zip(requests, needs_lookup) if lookup])
+        regions[needs_lookup] = lookup_regions(artifacts["grid"], coordinates)
+
+    valid = (regions >= 0) & (regions < artifacts["n_regions"])
+    predictions = np.full(len(requests), np.nan)
+    cache = artifacts["forecast_cache"]
+    if cache is not None:
+        cache_slots = forecast_slots(cache, slots.to_numpy())
+        cached = valid & (cache_slots >= 0)
+        predictions[cached] = cache["forecasts"][cache_slots[cached],
+                                                 regions[cached]]
+
+    # the model is the fallback for slots outside of the cache
+    slot_table = artifacts["slot_table"]
+    missing = valid & np.isnan(predictions)
+    feature_slots = np.where(missing,
+                             table_slots(slot_table, slots.to_numpy()), -1)
+    scored = feature_slots >= 0
+    scored[scored] = slot_table["present"][feature_slots[scored],
+                                           regions[scored]]
+    if scored.any():
+        batch = gather_rows(slot_table, feature_slots[scored],
+                            regions[scored])
+        predictions[scored] = predict_compiled(artifacts["compiled"], batch)
+    found = ~np.isnan(predictions)
+    return [(slot, region, prediction if has_row else None)
+            for slot, region, prediction, has_row
+            in zip(slots, regions, predictions, found)]
+
+
+def create_app(root_path=root_path, params=None):
+    if params is None:
+        params = read_params(root_path / "params.yaml")
+    serving_params = params["serving"]
+    state = {}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # load the artifacts once and start the batching loop
+        artifacts = load_serving_artifacts(
+            root_path, feature_set=serving_params["feature_set"],
+            **params["region_grid"])
+        logger.info("Artifacts loaded successfully")
+        state["batcher"] = MicroBatcher(
+            lambda requests: predict_requests(artifacts, requests),
+            max_batch_size=serving_params["max_batch_size"],
+            max_wait_ms=serving_params["max_wait_ms"])
+        state["batcher"].start()
+        yield
+        await state["batcher"].stop()
+
+    app = FastAPI(title="Uber Demand Prediction", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/predict", response_model=PredictResponse)
+    async def predict(request: PredictRequest):
+        try:
+            slot, region, prediction = await state["batcher"].submit(request)
+        except ValueError as e:
+            # a request the batch could not score on its own
+            raise HTTPException(status_code=422, detail=str(e))
+        if prediction is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No features for region {region} at {slot}")
+        return PredictResponse(timestamp=slot, region=int(region),
+                               predicted_pickups=float(prediction))
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # serve on the port the Dockerfile exposes next to the streamlit app
+    serving_params = read_params()["serving"]
+    uvicorn.run(create_app(), host=serving_params["host"],
+                port=serving_params["port"])
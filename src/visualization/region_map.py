@@ -0,0 +1,148 @@
+import pandas as pd
+
+
+# centre of the map
+nyc_location = [40.7831, -73.9712]
+
+# one color per region
+region_palette = ["#FF0000", "#FF4500", "#FF8C00", "#FFD700", "#ADFF2F",
+                  "#32CD32", "#008000", "#006400", "#00FF00", "#7CFC00",
+                  "#00FA9A", "#00FFFF", "#40E0D0", "#4682B4", "#1E90FF",
+                  "#0000FF", "#0000CD", "#8A2BE2", "#9932CC", "#BA55D3",
+                  "#FF00FF", "#FF1493", "#C71585", "#FF6347", "#FFA07A",
+                  "#FFDAB9", "#FFE4B5", "#F5DEB3", "#EEE8AA", "#FFB6C1"]
+
+# region names mapping (based on NYC neighborhoods)
+region_names = {0: "Upper West Side",
+                1: "Upper East Side",
+                2: "Midtown West",
+                3: "Midtown East",
+                4: "Chelsea",
+                5: "Gramercy",
+                6: "Greenwich Village",
+                7: "SoHo",
+                8: "Tribeca",
+                9: "Financial District",
+                10: "East Village",
+                11: "Lower East Side",
+                12: "East Harlem",
+                13: "Central Harlem",
+                14: "Morningside Heights",
+                15: "Hamilton Heights",
+                16: "Washington Heights",
+                17: "Inwood",
+                18: "Roosevelt Island",
+                19: "Battery Park",
+                20: "Chinatown",
+                21: "NoHo",
+                22: "Civic Center",
+                23: "Little Italy",
+                24: "Nolita",
+                25: "Two Bridges",
+                26: "Stuyvesant Town",
+                27: "Kips Bay",
+                28: "Murray Hill",
+                29: "Tudor City"}
+
+
+def region_name(region):
+    return region_names.get(region, f"Region {region}")
+
+
+def region_colors(regions):
+    # colors in the order the regions first appear
+    return {int(region): region_palette[ind % len(region_palette)]
+            for ind, region in enumerate(pd.unique(regions))}
+
+
+def region_layer(df_plot, colors):
+    # the sampled points as one GeoJSON feature collection with a single
+    # MultiPoint feature per region, built once
+    columns = ["pickup_longitude", "pickup_latitude"]
+    features = []
+    for region, points in df_plot.groupby("region", sort=False):
+        region = int(region)
+        coordinates = points[columns].to_numpy().tolist()
+        properties = {"region": region,
+                      "name": f"Region: {region_name(region)}",
+                      "color": colors.get(region, "#000000")}
+        features.append({"type": "Feature",
+                         "geometry": {"type": "MultiPoint",
+                                      "coordinates": coordinates},
+                         "properties": properties})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def polygon_layer(region_polygons, colors):
+    # the region polygons with the name and color of every region
+    features = []
+    for feature in region_polygons["features"]:
+        region = feature["properties"]["region"]
+        area = feature["properties"]["area_km2"]
+        name = f"Region: {region_name(region)} ({area:.2f} km²)"
+        properties = {**feature["properties"],
+                      "name": name,
+                      "color": colors.get(region, "#000000")}
+        features.append({**feature, "properties": properties})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def polygon_centres(region_polygons):
+    # precomputed centroid of every region polygon
+    centroids = {feature["properties"]["region"]:
+                 feature["properties"]["centroid"]
+                 for feature in region_polygons["features"]}
+    return pd.DataFrame([[latitude, longitude]
+                         for longitude, latitude in centroids.values()],
+                        index=pd.Index(list(centroids), name="region"),
+                        columns=["pickup_latitude", "pickup_longitude"])
+
+
+def region_centres(df_plot):
+    # mean location of the sampled points of every region
+    columns = ["pickup_latitude", "pickup_longitude"]
+    return df_plot.groupby("region")[columns].mean()
+
+
+def style_region(feature):
+    color = feature["properties"]["color"]
+    return {"color": color, "fillColor": color, "fillOpacity": 0.6,
+            "weight": 1}
+
+
+def build_map(layer, colors, centres=None, forecast=None, location=None,
+              region=None):
+    # the static region layer plus the per request demand and location,
+    # folium is only imported once a map is drawn
+    import folium
+    m = folium.Map(location=nyc_location, zoom_start=12)
+    folium.GeoJson(layer,
+                   name="Regions",
+                   marker=folium.CircleMarker(radius=3, fill=True),
+                   style_function=style_region,
+                   popup=folium.GeoJsonPopup(fields=["name"],
+                                             labels=False)).add_to(m)
+
+    # demand overlay at the centre of every region
+    if forecast is not None and centres is not None:
+        for region_id, prediction in zip(*forecast):
+            region_id = int(region_id)
+            if region_id not in centres.index:
+                continue
+            tooltip = f"{region_name(region_id)}: {int(prediction)} pickups"
+            folium.CircleMarker(location=centres.loc[region_id].tolist(),
+                                radius=10,
+                                color="#000000",
+                                weight=1,
+                                fill=True,
+                                fill_color=colors.get(region_id, "#000000"),
+                                fill_opacity=0.9,
+                                tooltip=tooltip).add_to(m)
+
+    # current location with a special marker
+    if location is not None:
+        folium.Marker(location=location,
+                      popup=f"Your Location<br>Region: {region_name(region)}",
+                      icon=folium.Icon(color='red',
+                                       icon='info-sign')).add_to(m)
+    return m
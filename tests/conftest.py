@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+from src.features.lag_features import build_lag_features
+
+
+@pytest.fixture(scope="session")
+def lag_feature_data():
+    # lag features of random pickups per region in 15 minute slots,
+    # first_slots lets regions start later than the others
+    def build(start, n_days, regions, first_slots=None):
+        rng = np.random.default_rng(0)
+        index = pd.date_range(start, periods=n_days * 96, freq="15min")
+        frames = []
+        for region in regions:
+            first_slot = (first_slots or {}).get(region, 0)
+            frame = pd.DataFrame(
+                {"region": region,
+                 "total_pickups": rng.integers(10, 200, len(index)),
+                 "avg_pickups": rng.integers(10, 200, len(index))
+                 .astype(float)},
+                index=pd.DatetimeIndex(index, name="tpep_pickup_datetime"))
+            frames.append(frame[first_slot:])
+        return build_lag_features(pd.concat(frames)).drop(columns=["month"])
+
+    return build
+
+
+@pytest.fixture(scope="session")
+def region_kmeans():
+    # fit a small scaler and kmeans on points inside the inlier box
+    rng = np.random.default_rng(0)
+    coordinates = pd.DataFrame(
+        np.column_stack([rng.uniform(-74.05, -73.70, 5000),
+                         rng.uniform(40.60, 40.85, 5000)]),
+        columns=["pickup_longitude", "pickup_latitude"])
+    scaler = StandardScaler().fit(coordinates)
+    mini_batch = MiniBatchKMeans(n_clusters=30, n_init=3, random_state=42)
+    mini_batch.fit(scaler.transform(coordinates))
+    return scaler, mini_batch
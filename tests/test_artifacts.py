@@ -0,0 +1,41 @@
+import os
+import pytest
+from src.serving.artifacts import ArtifactCache
+
+
+def test_artifacts_reload_when_the_file_changes(tmp_path):
+    path = tmp_path / "artifact.txt"
+    path.write_text("v1")
+    loads = []
+
+    def loader(path):
+        loads.append(path)
+        return path.read_text()
+
+    cache = ArtifactCache()
+    assert cache.get("artifact", path, loader) == "v1"
+    assert cache.get("artifact", path, loader) == "v1"
+    assert len(loads) == 1
+
+    path.write_text("v2")
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+    assert cache.get("artifact", path, loader) == "v2"
+    assert cache.timings["artifact"]["loads"] == 2
+
+
+def test_failed_reload_keeps_the_previous_version(tmp_path):
+    path = tmp_path / "artifact.txt"
+    path.write_text("1")
+    cache = ArtifactCache()
+    assert cache.get("artifact", path, lambda path: int(path.read_text())) == 1
+    path.write_text("partial")
+    assert cache.get("artifact", path, lambda path: int(path.read_text())) == 1
+    # the first load has no previous version to fall back to
+    with pytest.raises(ValueError):
+        ArtifactCache().get("artifact", path,
+                            lambda path: int(path.read_text()))
+
+
+def test_optional_artifacts(tmp_path):
+    assert ArtifactCache().get("artifact", tmp_path / "missing.npz",
+                               lambda path: 1, optional=True) is None
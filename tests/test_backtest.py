@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import mean_absolute_percentage_error
+from src.models.train import train_model
+from src.models.backtest import backtest
+
+
+@pytest.fixture(scope="module")
+def data(lag_feature_data):
+    # four weeks of demand of 3 regions
+    return lag_feature_data("2016-01-01", 28, range(3))
+
+
+def test_folds_match_a_model_per_fold(data):
+    folds, regions = backtest(data, n_folds=3, test_slots=96 * 7, n_jobs=2)
+    origins = pd.to_datetime(["2016-01-08", "2016-01-15", "2016-01-22"])
+    assert list(folds["origin"]) == list(origins)
+    assert regions.shape == (3, 3)
+    for fold, row in folds.iterrows():
+        trainset = data.loc[data.index < row["origin"]]
+        testset = data.loc[(data.index >= row["origin"]) &
+                           (data.index < row["test_end"])]
+        assert row["n_train"] == len(trainset)
+        assert row["n_test"] == len(testset)
+        encoder, model = train_model(trainset)
+        X_test = encoder.transform(testset.drop(columns=["total_pickups"]))
+        y_test = testset["total_pickups"]
+        y_pred = pd.Series(model.predict(X_test), index=testset.index)
+        np.testing.assert_allclose(
+            row["MAPE"], mean_absolute_percentage_error(y_test, y_pred))
+        for region in range(3):
+            in_region = testset["region"] == region
+            np.testing.assert_allclose(
+                regions.loc[fold, region],
+                mean_absolute_percentage_error(y_test[in_region],
+                                               y_pred[in_region]))
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from sklearn.pipeline import Pipeline
+from src.models.train import train_model
+from src.models.compiled_model import (compile_model, predict_compiled,
+                                       save_compiled_model,
+                                       load_compiled_model)
+
+
+@pytest.fixture(scope="module")
+def train_data(lag_feature_data):
+    # lag features of random pickups, region 3 never occurs
+    return lag_feature_data("2016-01-01", 14, [0, 1, 2, 4, 5])
+
+
+def test_compiled_model_matches_pipeline(train_data, tmp_path):
+    X = train_data.drop(columns=["total_pickups"])
+    encoder, model = train_model(train_data, solver="dense")
+    pipe = Pipeline([("encoder", encoder), ("reg", model)])
+    save_compiled_model(compile_model(encoder, model),
+                        tmp_path / "compiled_model.npz")
+    compiled = load_compiled_model(tmp_path / "compiled_model.npz")
+    np.testing.assert_allclose(predict_compiled(compiled, X), pipe.predict(X),
+                               rtol=1e-9, atol=1e-9)
+    # a dict of arrays is scored the same way
+    columns = {column: X[column].to_numpy() for column in X.columns}
+    np.testing.assert_allclose(predict_compiled(compiled, columns),
+                               pipe.predict(X), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("region", [3, 6])
+def test_unknown_regions_raise(train_data, region):
+    X = train_data.drop(columns=["total_pickups"])
+    encoder, model = train_model(train_data, solver="dense")
+    compiled = compile_model(encoder, model)
+    with pytest.raises(ValueError):
+        predict_compiled(compiled, X.assign(region=region))
+
+
+def test_int8_categories_up_to_127(lag_feature_data):
+    # region ids of the int8 feature schema, the largest one fits
+    train_data = lag_feature_data("2016-01-01", 7, [0, 1, 127])
+    train_data = train_data.astype({"region": "int8", "day_of_week": "int8"})
+    X = train_data.drop(columns=["total_pickups"])
+    encoder, model = train_model(train_data, solver="dense")
+    pipe = Pipeline([("encoder", encoder), ("reg", model)])
+    compiled = compile_model(encoder, model)
+    np.testing.assert_allclose(predict_compiled(compiled, X), pipe.predict(X),
+                               rtol=1e-9, atol=1e-9)
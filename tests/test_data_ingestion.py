@@ -0,0 +1,120 @@
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+from src.data.data_ingestion import (streamed_partitions, stream_partitions,
+                                     convert_to_parquet, read_parquet_df,
+                                     read_raw_data, min_latitude,
+                                     max_latitude, min_longitude,
+                                     max_longitude, min_fare_amount_val,
+                                     max_fare_amount_val,
+                                     min_trip_distance_val,
+                                     max_trip_distance_val)
+
+
+pickup_times = pd.date_range("2016-01-01", periods=1000, freq="1min")
+df = pd.DataFrame({"tpep_pickup_datetime": pickup_times,
+                   "pickup_latitude": 40.7,
+                   "pickup_longitude": -73.9})
+
+
+def test_streamed_partitions_match_the_written_parts(tmp_path):
+    ddf = dd.from_pandas(df, npartitions=7)
+    chunks = list(streamed_partitions(ddf, tmp_path / "parts",
+                                      file_format="parquet", max_in_flight=3))
+    parts = sorted((tmp_path / "parts").glob("part.*.parquet"))
+    assert len(chunks) == len(parts) == 7
+    for chunk, part in zip(chunks, parts):
+        pd.testing.assert_frame_equal(pd.read_parquet(part),
+                                      chunk.reset_index(drop=True))
+    pd.testing.assert_frame_equal(pd.concat(chunks), df)
+
+
+def test_stream_partitions_writes_every_partition(tmp_path):
+    save_dir = tmp_path / "df_without_outliers"
+    # parts of an earlier run with more partitions are removed
+    save_dir.mkdir()
+    (save_dir / "part.00009.csv").write_text("stale")
+    ddf = dd.from_pandas(df, npartitions=5)
+    n_rows = stream_partitions(ddf, save_dir, max_in_flight=2)
+    parts = sorted(save_dir.glob("part.*"))
+    assert n_rows == len(df)
+    assert [part.name for part in parts] == [f"part.{ind:05d}.csv"
+                                             for ind in range(5)]
+    written = [pd.read_csv(part, parse_dates=["tpep_pickup_datetime"])
+               for part in parts]
+    pd.testing.assert_frame_equal(pd.concat(written, ignore_index=True), df)
+
+
+def raw_trips(n_rows=2000, seed=0):
+    # raw trips around the inlier box, a few of them exactly on its bounds
+    rng = np.random.default_rng(seed)
+    raw = pd.DataFrame({
+        "VendorID": 1,
+        "tpep_pickup_datetime": pd.Timestamp("2016-01-01") +
+        pd.to_timedelta(np.sort(rng.integers(0, 86400, n_rows)), unit="s"),
+        "pickup_longitude": rng.uniform(-74.1, -73.65, n_rows).round(6),
+        "pickup_latitude": rng.uniform(40.55, 40.9, n_rows).round(6),
+        "trip_distance": rng.uniform(0, 30, n_rows).round(2),
+        "dropoff_longitude": rng.uniform(-74.1, -73.65, n_rows).round(6),
+        "dropoff_latitude": rng.uniform(40.55, 40.9, n_rows).round(6),
+        "fare_amount": rng.uniform(0, 90, n_rows).round(2)})
+    bounds = {"pickup_latitude": [min_latitude, max_latitude],
+              "pickup_longitude": [min_longitude, max_longitude],
+              "dropoff_latitude": [min_latitude, max_latitude],
+              "dropoff_longitude": [min_longitude, max_longitude],
+              "fare_amount": [min_fare_amount_val, max_fare_amount_val],
+              "trip_distance": [min_trip_distance_val,
+                                max_trip_distance_val]}
+    # the rows on a bound are inliers in every other column
+    raw.loc[:2 * len(bounds) - 1, list(bounds)] = [
+        min_latitude + 0.1, min_longitude + 0.1, min_latitude + 0.1,
+        min_longitude + 0.1, 10.0, 2.0]
+    for ind, (column, values) in enumerate(bounds.items()):
+        raw.loc[ind * 2:ind * 2 + 1, column] = values
+    return raw
+
+
+def test_parquet_path_matches_csv_path(tmp_path):
+    raw_paths = []
+    for month in range(2):
+        raw_path = tmp_path / f"yellow_tripdata_2016-0{month + 1}.csv"
+        raw_trips(seed=month).to_csv(raw_path, index=False)
+        raw_paths.append(raw_path)
+    params = {"streaming": {"blocksize": "32KB"}}
+
+    csv_df = read_raw_data(raw_paths, {**params, "file_format": "csv"})
+    parquet_df = read_raw_data(raw_paths,
+                               {**params, "file_format": "parquet"})
+    expected = csv_df.compute().reset_index(drop=True)
+    actual = parquet_df.compute().reset_index(drop=True)
+    # the parquet copy stores the coordinates in float32
+    expected = expected.astype({column: actual[column].dtype
+                                for column in expected.columns})
+    assert 0 < len(actual) < 2 * 2000
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_convert_to_parquet_reconverts_a_changed_csv(tmp_path):
+    csv_path = tmp_path / "trips.csv"
+    parquet_path = tmp_path / "parquet" / "trips.parquet"
+    raw_trips(n_rows=100).to_csv(csv_path, index=False)
+    convert_to_parquet(csv_path, parquet_path)
+    assert len(read_parquet_df(parquet_path, filters=None)) == 100
+
+    # a replaced csv is converted again instead of reusing the old copy
+    raw_trips(n_rows=50).to_csv(csv_path, index=False)
+    convert_to_parquet(csv_path, parquet_path)
+    assert len(read_parquet_df(parquet_path, filters=None)) == 50
+    assert not parquet_path.with_name("trips.parquet.tmp").exists()
+
+
+def test_convert_to_parquet_ignores_an_interrupted_conversion(tmp_path):
+    csv_path = tmp_path / "trips.csv"
+    parquet_path = tmp_path / "parquet" / "trips.parquet"
+    raw_trips(n_rows=100).to_csv(csv_path, index=False)
+    # parts of a conversion that never finished, without a stamp
+    parquet_path.mkdir(parents=True)
+    raw_trips(n_rows=20).to_parquet(parquet_path / "part.0.parquet",
+                                    index=False)
+    convert_to_parquet(csv_path, parquet_path)
+    assert len(read_parquet_df(parquet_path, filters=None)) == 100
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from src.features.demand_matrix import resample_demand, append_demand
+
+
+# random pickups where some regions start late and end early
+rng = np.random.default_rng(0)
+n_rows = 50000
+offsets = pd.to_timedelta(rng.integers(0, 7 * 24 * 3600, n_rows), unit="s")
+pickup_times = (pd.Timestamp("2016-01-01") + offsets).to_numpy()
+pickup_times = pickup_times.astype("datetime64[ns]")
+regions = rng.integers(0, 12, n_rows)
+late = regions == 3
+pickup_times[late] = pickup_times[late] + np.timedelta64(2, "D")
+regions[regions == 11] = 10
+
+
+def resample_with_pandas(pickup_times, regions, alpha, epsilon_val=10):
+    # the groupby resample implementation the engine replaces
+    df = pd.DataFrame({"region": regions},
+                      index=pd.DatetimeIndex(pickup_times,
+                                             name="tpep_pickup_datetime"))
+    resampled_data = df.groupby("region")["region"].resample("15min").count()
+    resampled_data.name = "total_pickups"
+    resampled_data = resampled_data.reset_index(level=0)
+    resampled_data.replace({"total_pickups": {0: epsilon_val}}, inplace=True)
+    region_grp = resampled_data.groupby("region")["total_pickups"]
+    resampled_data["avg_pickups"] = (region_grp.ewm(alpha=alpha).mean()
+                                     .round().values)
+    return resampled_data
+
+
+def test_resample_demand_matches_pandas():
+    expected = resample_with_pandas(pickup_times, regions, alpha=0.4)
+    result, _ = resample_demand(pickup_times, regions, n_regions=12,
+                                alpha=0.4)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_append_demand_matches_full_rebuild():
+    full, full_checkpoint = resample_demand(pickup_times, regions,
+                                            n_regions=12, alpha=0.4)
+    # split the pickups into the old data and a newly arrived day
+    cut = np.datetime64("2016-01-07")
+    old = pickup_times < cut
+    head, checkpoint = resample_demand(pickup_times[old], regions[old],
+                                       n_regions=12, alpha=0.4)
+    tail, new_checkpoint = append_demand(pickup_times[~old], regions[~old],
+                                         checkpoint)
+    result = (pd.concat([head, tail])
+              .reset_index()
+              .sort_values(["region", "tpep_pickup_datetime"], kind="stable")
+              .set_index("tpep_pickup_datetime"))
+    pd.testing.assert_frame_equal(result, full, check_dtype=False)
+    for key in full_checkpoint:
+        np.testing.assert_array_equal(new_checkpoint[key],
+                                      full_checkpoint[key])
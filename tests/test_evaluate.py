@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics import (mean_absolute_percentage_error,
+                             mean_absolute_error)
+from src.models.evaluate import error_breakdown
+
+
+# two days of 3 regions where region 1 misses its first 10 slots
+rng = np.random.default_rng(0)
+index = pd.date_range("2016-03-01", periods=2 * 96, freq="15min")
+frames = [pd.DataFrame(
+    {"region": region,
+     "total_pickups": rng.integers(10, 200, len(index))},
+    index=pd.DatetimeIndex(index, name="tpep_pickup_datetime"))
+    for region in range(3)]
+frames[1] = frames[1][10:]
+df = pd.concat(frames)
+y_true = df["total_pickups"].to_numpy()
+y_pred = y_true + rng.normal(2, 10, len(df))
+
+
+def test_breakdown_matches_grouped_metrics():
+    report = error_breakdown(df, y_pred)
+    assert np.isclose(report["overall"]["MAPE"],
+                      mean_absolute_percentage_error(y_true, y_pred))
+    assert report["overall"]["count"] == len(df)
+    for region in range(3):
+        in_region = df["region"].to_numpy() == region
+        assert np.isclose(report["region"]["MAPE"][region],
+                          mean_absolute_percentage_error(y_true[in_region],
+                                                         y_pred[in_region]))
+    time_of_day = df.index.strftime("%H:%M")
+    for slot in [0, 5, 50]:
+        in_slot = time_of_day == report["time_of_day"]["time"][slot]
+        # region 1 has the first 10 slots only on the second day
+        by_time = report["time_of_day"]
+        assert by_time["count"][slot] == (5 if slot < 10 else 6)
+        assert np.isclose(by_time["MAE"][slot],
+                          mean_absolute_error(y_true[in_slot],
+                                              y_pred[in_slot]))
+        assert np.isclose(by_time["bias"][slot],
+                          (y_pred[in_slot] - y_true[in_slot]).mean())
@@ -0,0 +1,56 @@
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pytest
+from src.data.data_ingestion import stream_partitions
+from src.features.extract_features import (build_cluster_cache,
+                                           assign_regions)
+from src.features.region_grid import build_region_grid
+
+
+# pickups in the column order of the ingestion output
+rng = np.random.default_rng(0)
+n_rows = 2500
+df = pd.DataFrame({
+    "tpep_pickup_datetime": pd.Timestamp("2016-01-01") +
+    pd.to_timedelta(rng.integers(0, 7 * 86400, n_rows), unit="s"),
+    "pickup_longitude": rng.uniform(-74.05, -73.70, n_rows),
+    "pickup_latitude": rng.uniform(40.60, 40.85, n_rows)})
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_cluster_cache_round_trips_the_parts(tmp_path, file_format):
+    data_path = tmp_path / "df_without_outliers"
+    stream_partitions(dd.from_pandas(df, npartitions=4), data_path,
+                      file_format=file_format)
+    cache_dir = tmp_path / "cluster_cache"
+    # chunks smaller than a part
+    build_cluster_cache(data_path, cache_dir, chunksize=300)
+
+    coordinates = np.fromfile(cache_dir / "pickup_coordinates.bin",
+                              dtype=np.float32).reshape(-1, 2)
+    pickup_times = np.fromfile(cache_dir / "pickup_times.bin",
+                               dtype="datetime64[ns]")
+    np.testing.assert_array_equal(
+        coordinates,
+        df[["pickup_longitude", "pickup_latitude"]].to_numpy(np.float32))
+    np.testing.assert_array_equal(
+        pickup_times, df["tpep_pickup_datetime"].to_numpy("datetime64[ns]"))
+
+
+def test_parallel_assignment_matches_kmeans(tmp_path, region_kmeans):
+    data_path = tmp_path / "df_without_outliers"
+    stream_partitions(dd.from_pandas(df, npartitions=1), data_path)
+    cache_dir = tmp_path / "cluster_cache"
+    coordinates, _ = build_cluster_cache(data_path, cache_dir)
+    grid = build_region_grid(*region_kmeans, cell_size=0.005)
+    # chunks smaller than the data, spread over two workers
+    assign_regions(cache_dir, grid, chunksize=400, n_jobs=2)
+
+    scaler, mini_batch = region_kmeans
+    coordinates = pd.DataFrame(coordinates, dtype=np.float64,
+                               columns=["pickup_longitude",
+                                        "pickup_latitude"])
+    expected = mini_batch.predict(scaler.transform(coordinates))
+    regions = np.fromfile(cache_dir / "regions.bin", dtype=np.int16)
+    np.testing.assert_array_equal(regions, expected)
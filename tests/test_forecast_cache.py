@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.models.train import train_model
+from src.models.compiled_model import compile_model, predict_compiled
+from src.models.forecast_cache import (materialize_forecasts,
+                                       cached_forecasts, forecast_slots)
+
+
+@pytest.fixture(scope="module")
+def data(lag_feature_data):
+    # lag features where region 2 starts a day late
+    return lag_feature_data("2016-03-01", 7, range(4), first_slots={2: 96})
+
+
+@pytest.fixture(scope="module")
+def compiled(data):
+    encoder, model = train_model(data)
+    return compile_model(encoder, model)
+
+
+@pytest.fixture(scope="module")
+def cache(data, compiled):
+    return materialize_forecasts(data, compiled)
+
+
+def test_cached_forecasts_match_model(data, compiled, cache):
+    for timestamp in [data.index[10], pd.Timestamp("2016-03-03 10:15"),
+                      data.index.max()]:
+        input_data = data.loc[timestamp].sort_values("region")
+        regions, predictions = cached_forecasts(cache, timestamp)
+        np.testing.assert_array_equal(regions,
+                                      input_data["region"].to_numpy())
+        X = input_data.drop(columns=["total_pickups"])
+        np.testing.assert_allclose(predictions, predict_compiled(compiled, X))
+
+
+def test_slots_outside_the_cache(cache):
+    assert cached_forecasts(cache, pd.Timestamp("2016-04-01")) is None
+    assert cached_forecasts(cache, pd.Timestamp("2016-03-03 10:07")) is None
+    timestamps = pd.DatetimeIndex(["2016-02-01", "2016-03-01 01:00"])
+    slots = forecast_slots(cache, timestamps.to_numpy())
+    assert slots[0] == -1 and slots[1] >= 0
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+import pytest
+from src.import_benchmark import entry_imports, import_times
+
+
+def loaded_packages(module):
+    # top level packages in sys.modules after importing module in a fresh
+    # interpreter
+    code = (f"import sys, {module}; "
+            "print(' '.join({name.split('.')[0] for name in sys.modules}))")
+    result = subprocess.run([sys.executable, "-c", code],
+                            capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+@pytest.mark.parametrize("module,deferred", [
+    ("src.serving.service", {"scipy", "sklearn", "folium"}),
+    ("src.models.forecast_cache", {"scipy", "sklearn"}),
+    ("src.models.recursive_forecast", {"scipy", "sklearn"}),
+    ("src.visualization.region_map", {"folium"}),
+    ("src.models.evaluate", {"mlflow", "dagshub"}),
+    ("src.models.register_model", {"mlflow", "dagshub"})])
+def test_heavy_imports_are_deferred(module, deferred):
+    assert not loaded_packages(module) & deferred
+
+
+def test_app_imports():
+    code = entry_imports("app.py")
+    assert code.startswith("import streamlit as st")
+    for package in ["mlflow", "dagshub", "folium", "streamlit_folium"]:
+        assert f"import {package}" not in code
+        assert f"from {package} " not in code
+
+
+def test_import_times_per_package():
+    packages = import_times("import json")
+    assert "json" in packages and packages["json"] >= 0
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.features.demand_matrix import resample_demand, append_demand
+from src.features.feature_processing import process_features, split_features
+from src.features.incremental_features import (new_lag_features,
+                                               route_months)
+
+
+split_params = {"train_months": [1, 2], "test_months": [3]}
+data = pd.DataFrame({"month": [3, 4, 4]})
+
+
+def test_unrouted_months_raise():
+    with pytest.raises(ValueError, match=r"\[4\]"):
+        route_months(data, split_params)
+
+
+def test_split_routes_the_new_months():
+    routed = route_months(data, split_params, split="test")
+    assert routed["test_months"] == [3, 4] and routed["train_months"] == [1, 2]
+    assert split_params["test_months"] == [3]
+
+
+def test_new_lag_features_match_full_rebuild():
+    # pickups from february into march, region 3 starts late and region 4
+    # has no pickups in the old months
+    rng = np.random.default_rng(0)
+    n_rows = 40000
+    pickup_times = (pd.Timestamp("2016-02-25") +
+                    pd.to_timedelta(rng.integers(0, 9 * 24 * 3600, n_rows),
+                                    unit="s")).to_numpy()
+    regions = rng.integers(0, 5, n_rows)
+    cut = np.datetime64("2016-03-01")
+    late = (regions == 3) | (regions == 4)
+    pickup_times[late] = pickup_times[late] + np.timedelta64(2, "D")
+    regions[(regions == 4) & (pickup_times < cut)] = 0
+    features = {"lags": [1, 2, 3], "rolling_windows": [4]}
+    params = {"feature_processing": {"train_months": [2], "test_months": [3],
+                                     "features": features}}
+
+    full, _ = resample_demand(pickup_times, regions, n_regions=5, alpha=0.4)
+    expected = process_features(full, params)
+
+    # the old months and the newly arrived one
+    old = pickup_times < cut
+    head, checkpoint = resample_demand(pickup_times[old], regions[old],
+                                       n_regions=5, alpha=0.4)
+    tail, _ = append_demand(pickup_times[~old], regions[~old], checkpoint)
+    trainset, testset = process_features(head, params)
+    new_trainset, new_testset = split_features(
+        new_lag_features(tail, checkpoint, features),
+        params["feature_processing"])
+    for result, full_table in zip([pd.concat([trainset, new_trainset]),
+                                   pd.concat([testset, new_testset])],
+                                  expected):
+        result = (result.reset_index()
+                  .sort_values(["region", "tpep_pickup_datetime"],
+                               kind="stable")
+                  .set_index("tpep_pickup_datetime"))
+        full_table = (full_table.reset_index()
+                      .sort_values(["region", "tpep_pickup_datetime"],
+                                   kind="stable")
+                      .set_index("tpep_pickup_datetime"))
+        pd.testing.assert_frame_equal(result, full_table,
+                                      check_dtype=False)
+
+
+def test_short_checkpoints_raise():
+    pickup_times = pd.date_range("2016-02-28", periods=500,
+                                 freq="7min").to_numpy()
+    regions = np.zeros(len(pickup_times), dtype=np.int64)
+    resampled_data, checkpoint = resample_demand(pickup_times, regions,
+                                                 n_regions=1, alpha=0.4)
+    with pytest.raises(ValueError, match="too few pickups"):
+        new_lag_features(resampled_data, checkpoint, {"weekly_lag": True})
+
+
+def test_empty_increments_raise():
+    pickup_times = pd.date_range("2016-02-28", periods=500,
+                                 freq="7min").to_numpy()
+    regions = np.zeros(len(pickup_times), dtype=np.int64)
+    _, checkpoint = resample_demand(pickup_times, regions, n_regions=1,
+                                    alpha=0.4)
+    with pytest.raises(ValueError, match="no pickups"):
+        append_demand(pickup_times[:0], regions[:0], checkpoint)
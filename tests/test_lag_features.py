@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from src.features.lag_features import build_lag_features
+
+
+# long table of contiguous slots per region with different spans
+rng = np.random.default_rng(0)
+frames = []
+spans = [(0, 900), (50, 700), (10, 3), (200, 800)]
+for region, (start, n_slots) in enumerate(spans):
+    index = pd.date_range("2016-01-01", periods=n_slots, freq="15min")[start:]
+    frames.append(pd.DataFrame(
+        {"region": region,
+         "total_pickups": rng.integers(10, 200, len(index)),
+         "avg_pickups": rng.integers(10, 200, len(index)).astype(float)},
+        index=pd.DatetimeIndex(index, name="tpep_pickup_datetime")))
+resampled_data = pd.concat(frames)
+
+
+def test_lags_match_groupby_shift():
+    region_grp = resampled_data.groupby("region")
+    lag_features = region_grp["total_pickups"].shift([1, 2, 3, 4])
+    expected = pd.concat([lag_features, resampled_data], axis=1).dropna()
+    lag_names = {name: f"lag_{ind+1}"
+                 for ind, name in enumerate(expected.columns[0:4])}
+    expected = expected.rename(columns=lag_names)
+    result = build_lag_features(resampled_data)
+    pd.testing.assert_frame_equal(
+        result.drop(columns=["day_of_week", "month"]), expected)
+
+
+def test_rolling_and_weekly_features():
+    result = build_lag_features(resampled_data, lags=[1], rolling_windows=[8],
+                                weekly_lag=True)
+    region_grp = resampled_data.groupby("region")["total_pickups"]
+    rolling_mean = region_grp.transform(
+        lambda pickups: pickups.shift(1).rolling(8).mean())
+    last_week = region_grp.shift(672)
+    np.testing.assert_allclose(result["rolling_mean_8"],
+                               rolling_mean.loc[last_week.notna()].values)
+    np.testing.assert_array_equal(result["last_week_pickups"],
+                                  last_week.dropna().values)
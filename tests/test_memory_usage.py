@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from src.memory_usage import reset_peak_rss, peak_rss_mb, measured_peak_rss_mb
+
+
+def test_reset_starts_a_new_peak():
+    if not reset_peak_rss():
+        pytest.skip("the peak RSS can not be reset on this platform")
+    data = np.ones(50_000_000)
+    data_peak = peak_rss_mb()
+    del data
+    assert reset_peak_rss()
+    # the 400 MB array is not part of the new peak
+    assert measured_peak_rss_mb(True) < data_peak - 300
+
+
+def test_no_reset_gives_no_measurement():
+    assert np.isnan(measured_peak_rss_mb(False))
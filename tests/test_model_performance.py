@@ -1,22 +1,18 @@
 import pytest
-import mlflow
-import dagshub
 import json
 from pathlib import Path
 from sklearn.pipeline import Pipeline
 import joblib
-import pandas as pd
 from sklearn.metrics import mean_absolute_percentage_error
 from sklearn import set_config
+from src.features.feature_store import features_path, load_features
 
 
 set_config(transform_output="pandas")
 
-import dagshub
-dagshub.init(repo_owner='MohammoD2', repo_name='Uber_Demand_Pridiction-', mlflow=True)
+from src.models.tracking import init_tracking
 
-# set the mlflow tracking uri
-mlflow.set_tracking_uri("https://dagshub.com/MohammoD2/Uber_Demand_Pridiction-.mlflow")
+mlflow = init_tracking()
 
 
 def load_model_information(file_path):
@@ -36,8 +32,8 @@ current_path = Path(__file__)
 # set the root path
 root_path = current_path.parent.parent
 # data_path
-train_data_path = root_path / "data/processed/train.csv"
-test_data_path = root_path / "data/processed/test.csv"
+train_data_path = features_path(root_path, "train")
+test_data_path = features_path(root_path, "test")
 
 # path for the encoder
 encoder_path = root_path / "models/encoder.joblib"
@@ -55,7 +51,7 @@ model_pipe = Pipeline(steps=[
                                     (test_data_path,0.1)])
 def test_performance(data_path, threshold):
     # load the data from path
-    data = pd.read_csv(data_path, parse_dates=["tpep_pickup_datetime"]).set_index("tpep_pickup_datetime")
+    data = load_features(data_path)
     # make X and y
     X = data.drop(columns=["total_pickups"])
     y = data["total_pickups"]
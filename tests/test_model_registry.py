@@ -1,12 +1,8 @@
-import mlflow
-import dagshub
 import json
 
-import dagshub
-dagshub.init(repo_owner='MohammoD2', repo_name='Uber_Demand_Pridiction-', mlflow=True)
+from src.models.tracking import init_tracking
 
-# set the mlflow tracking uri
-mlflow.set_tracking_uri("https://dagshub.com/MohammoD2/Uber_Demand_Pridiction-.mlflow")
+mlflow = init_tracking()
 
 
 def load_model_information(file_path):
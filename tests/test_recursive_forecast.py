@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from src.features.demand_matrix import resample_demand
+from src.features.lag_features import build_lag_features
+from src.models.train import train_model
+from src.models.compiled_model import compile_model, predict_compiled
+from src.models.recursive_forecast import (demand_state, forecast_from_state,
+                                           forecast_from_checkpoint)
+
+
+# a week of pickups of 3 regions where region 2 starts a day late
+alpha = 0.4
+rng = np.random.default_rng(0)
+start = pd.Timestamp("2016-03-01").value
+pickup_times = rng.integers(start, start + 7 * pd.Timedelta("1D").value,
+                            60000).astype("datetime64[ns]")
+regions = rng.integers(0, 3, len(pickup_times))
+keep = (regions != 2) | (pickup_times >= np.datetime64("2016-03-02"))
+resampled_data, checkpoint = resample_demand(pickup_times[keep],
+                                             regions[keep], 3, alpha)
+data = build_lag_features(resampled_data).drop(columns=["month"])
+encoder, model = train_model(data)
+compiled = compile_model(encoder, model)
+state = demand_state(resampled_data, alpha)
+
+
+def reference_forecast(region, origin, steps):
+    # one region rolled forward with pandas, avg_pickups is the rounded
+    # EWMA up to the slot before the predicted one
+    rows = ((resampled_data["region"] == region) &
+            (resampled_data.index <= origin))
+    history = resampled_data.loc[rows, "total_pickups"]
+    pickups = history.astype(float).tolist()
+    predictions = []
+    for step in range(1, steps + 1):
+        time = origin + step * pd.Timedelta("15min")
+        row = {f"lag_{lag}": [pickups[-lag]] for lag in range(1, 5)}
+        average = pd.Series(pickups).ewm(alpha=alpha).mean().iloc[-1]
+        row.update({"region": [region],
+                    "day_of_week": [time.day_of_week],
+                    "avg_pickups": [np.round(average)]})
+        predictions.append(predict_compiled(compiled, row)[0])
+        pickups.append(predictions[-1])
+    return np.array(predictions)
+
+
+def test_forecasts_match_rolling_forward_one_region():
+    origins = pd.DatetimeIndex(["2016-03-02 06:00", "2016-03-05 23:45"])
+    forecasts = forecast_from_state(compiled, state, origins.to_numpy(),
+                                    steps=8)
+    assert forecasts.shape == (2, 3, 8)
+    for ind, origin in enumerate(origins):
+        for region in range(3):
+            np.testing.assert_allclose(forecasts[ind, region],
+                                       reference_forecast(region, origin, 8),
+                                       rtol=1e-9)
+
+
+def test_origins_without_history():
+    origins = pd.DatetimeIndex(["2016-03-01 00:30", "2016-03-01 06:00",
+                                "2016-04-01"])
+    forecasts = forecast_from_state(compiled, state, origins.to_numpy(),
+                                    steps=4)
+    assert np.isnan(forecasts[0]).all() and np.isnan(forecasts[2]).all()
+    assert np.isfinite(forecasts[1, :2]).all()
+    assert np.isnan(forecasts[1, 2]).all()
+
+
+def test_checkpoint_continues_the_last_slot():
+    last_time = resampled_data.index.max()
+    forecasts = forecast_from_checkpoint(compiled, checkpoint, steps=32)
+    state_forecasts = forecast_from_state(compiled, state,
+                                          [last_time.to_datetime64()],
+                                          steps=32)
+    np.testing.assert_allclose(forecasts, state_forecasts[0])
+
+
+def test_forecasts_with_longer_lags():
+    # the window follows the lag set of the model, not a fixed length
+    long_data = build_lag_features(resampled_data, lags=list(range(1, 9)),
+                                   rolling_windows=[12])
+    long_data = long_data.drop(columns=["month"])
+    long_compiled = compile_model(*train_model(long_data))
+    origins = pd.DatetimeIndex(["2016-03-01 02:00", "2016-03-03 12:00"])
+    forecasts = forecast_from_state(long_compiled, state, origins.to_numpy(),
+                                    steps=4)
+    # 2:00 is only the 9th slot, short of the 12 slots of the rolling mean
+    assert np.isnan(forecasts[0]).all()
+    assert np.isfinite(forecasts[1]).all()
+    last_time = resampled_data.index.max().to_datetime64()
+    checkpoint_forecasts = forecast_from_state(long_compiled, state,
+                                               [last_time], steps=4)
+    assert np.isfinite(checkpoint_forecasts).all()
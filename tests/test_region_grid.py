@@ -0,0 +1,29 @@
+import pytest
+import numpy as np
+import pandas as pd
+from src.features.region_grid import (build_region_grid, check_region_grid,
+                                      lookup_regions)
+
+
+columns = ["pickup_longitude", "pickup_latitude"]
+
+
+@pytest.fixture(scope="module")
+def grid(region_kmeans):
+    return build_region_grid(*region_kmeans, cell_size=0.005)
+
+
+def test_grid_boundaries_match_kmeans(grid, region_kmeans):
+    scaler, mini_batch = region_kmeans
+    assert check_region_grid(grid, scaler, mini_batch, n_samples=20000) == 0
+
+
+@pytest.mark.parametrize(argnames="low,high",
+                         argvalues=[((-74.05, 40.60), (-73.70, 40.85)),
+                                    ((-74.20, 40.50), (-73.60, 40.95))])
+def test_lookup_matches_kmeans(grid, region_kmeans, low, high):
+    scaler, mini_batch = region_kmeans
+    points = np.random.default_rng(1).uniform(low, high, size=(20000, 2))
+    expected = mini_batch.predict(
+        scaler.transform(pd.DataFrame(points, columns=columns)))
+    assert (lookup_regions(grid, points) == expected).all()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from src.visualization.region_map import (region_colors, region_layer,
+                                          region_centres, build_map)
+
+
+# sampled points of 4 regions in shuffled order
+rng = np.random.default_rng(0)
+df_plot = pd.DataFrame({
+    "pickup_longitude": rng.uniform(-74.05, -73.70, 400),
+    "pickup_latitude": rng.uniform(40.60, 40.85, 400),
+    "region": rng.permutation(np.repeat([3, 0, 2, 1], 100))})
+
+
+def test_layer_has_one_feature_per_region():
+    colors = region_colors(df_plot["region"])
+    layer = region_layer(df_plot, colors)
+    assert len(layer["features"]) == 4
+    for feature in layer["features"]:
+        region = feature["properties"]["region"]
+        points = df_plot.loc[df_plot["region"] == region,
+                             ["pickup_longitude", "pickup_latitude"]]
+        assert (feature["geometry"]["coordinates"] ==
+                points.to_numpy().tolist())
+        assert feature["properties"]["color"] == colors[region]
+
+
+def test_map_renders_the_demand_overlay():
+    colors = region_colors(df_plot["region"])
+    m = build_map(region_layer(df_plot, colors), colors,
+                  centres=region_centres(df_plot),
+                  forecast=(np.array([0, 1]), np.array([12.4, 30.0])),
+                  location=[40.75, -73.98], region=1)
+    html = m.get_root().render()
+    assert "12 pickups" in html and "30 pickups" in html
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.features.region_polygons import build_region_polygons, polygon_regions
+
+
+columns = ["pickup_longitude", "pickup_latitude"]
+
+
+@pytest.fixture(scope="module")
+def region_polygons(region_kmeans):
+    return build_region_polygons(*region_kmeans, precision=12)
+
+
+def test_polygons_match_kmeans(region_polygons, region_kmeans):
+    scaler, mini_batch = region_kmeans
+    rng = np.random.default_rng(1)
+    points = pd.DataFrame(rng.uniform((-74.05, 40.60), (-73.70, 40.85),
+                                      size=(20000, 2)),
+                          columns=columns)
+    expected = mini_batch.predict(scaler.transform(points))
+    np.testing.assert_array_equal(
+        polygon_regions(region_polygons, points.to_numpy()), expected)
+
+
+def test_polygons_tile_the_box(region_polygons):
+    # the areas add up to the box, about 29.5 km by 27.8 km
+    areas = [feature["properties"]["area_km2"]
+             for feature in region_polygons["features"]]
+    assert len(areas) == 30
+    km_per_longitude = 111.320 * np.cos(np.radians(40.725))
+    assert abs(sum(areas) - 0.35 * km_per_longitude * 0.25 * 110.574) < 1.0
+    assert polygon_regions(region_polygons, [[-74.2, 40.7]])[0] == -1
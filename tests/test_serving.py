@@ -0,0 +1,142 @@
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+from src.features.region_grid import build_region_grid, save_region_grid
+from src.features.feature_store import features_path, save_features
+from src.models.train import train_model
+from src.models.compiled_model import compile_model, save_compiled_model
+from src.serving.batcher import MicroBatcher
+from src.serving.service import create_app
+
+
+params = {"serving": {"feature_set": "test",
+                      "max_batch_size": 64,
+                      "max_wait_ms": 5},
+          "region_grid": {"cell_size": 0.005}}
+
+
+@pytest.fixture(scope="module")
+def root_path(tmp_path_factory, lag_feature_data):
+    # artifacts of a small pipeline run with 5 regions
+    root_path = tmp_path_factory.mktemp("root")
+    (root_path / "models").mkdir()
+    (root_path / "data/processed").mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    coordinates = pd.DataFrame(
+        np.column_stack([rng.uniform(-74.05, -73.70, 2000),
+                         rng.uniform(40.60, 40.85, 2000)]),
+        columns=["pickup_longitude", "pickup_latitude"])
+    scaler = StandardScaler().fit(coordinates)
+    mini_batch = MiniBatchKMeans(n_clusters=5, n_init=3, random_state=42)
+    mini_batch.fit(scaler.transform(coordinates))
+    save_region_grid(build_region_grid(scaler, mini_batch, cell_size=0.005),
+                     root_path / "models/region_grid.npz")
+
+    data = lag_feature_data("2016-03-01", 7, range(5))
+    encoder, model = train_model(data)
+    save_compiled_model(compile_model(encoder, model),
+                        root_path / "models/compiled_model.npz")
+    save_features(data, features_path(root_path, "test"))
+    return root_path
+
+
+def test_batcher_coalesces_concurrent_submissions():
+    batch_sizes = []
+
+    def predict_batch(items):
+        batch_sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    async def submit_all():
+        batcher = MicroBatcher(predict_batch, max_batch_size=32,
+                               max_wait_ms=20)
+        batcher.start()
+        results = await asyncio.gather(*[batcher.submit(item)
+                                         for item in range(100)])
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(submit_all()) == [item * 2 for item in range(100)]
+    assert batch_sizes == [32, 32, 32, 4]
+
+
+def test_predict_endpoint(root_path):
+    with TestClient(create_app(root_path, params)) as client:
+        response = client.post("/predict",
+                               json={"timestamp": "2016-03-03T10:07:00",
+                                     "region": 2})
+        assert response.status_code == 200
+        assert response.json()["timestamp"] == "2016-03-03T10:15:00"
+        assert response.json()["region"] == 2
+
+        response = client.post("/predict",
+                               json={"timestamp": "2016-03-03T10:07:00",
+                                     "latitude": 40.75, "longitude": -73.98})
+        assert response.status_code == 200
+
+        # slots without features, unknown regions and missing locations
+        for request, status_code in [
+                ({"timestamp": "2016-04-03T10:00:00", "region": 2}, 404),
+                ({"timestamp": "2016-03-03T10:00:00", "region": 9}, 404),
+                ({"timestamp": "2016-03-03T10:00:00"}, 422)]:
+            response = client.post("/predict", json=request)
+            assert response.status_code == status_code
+
+
+def test_batcher_fails_only_the_bad_item():
+    def predict_batch(items):
+        if any(item < 0 for item in items):
+            raise ValueError("negative item")
+        return [item * 2 for item in items]
+
+    async def submit_all():
+        batcher = MicroBatcher(predict_batch, max_batch_size=32,
+                               max_wait_ms=20)
+        batcher.start()
+        results = await asyncio.gather(*[batcher.submit(item)
+                                         for item in [2, -1, 3]],
+                                       return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(submit_all())
+    assert results[0] == 4 and results[2] == 6
+    assert isinstance(results[1], ValueError)
+
+
+def test_predict_endpoint_rejects_bad_requests(root_path):
+    with TestClient(create_app(root_path, params)) as client:
+        for region in [-1, 2 ** 70]:
+            response = client.post("/predict",
+                                   json={"timestamp": "2016-03-03T10:07:00",
+                                         "region": region})
+            assert response.status_code == 422
+
+        # timestamps with an offset are served in new york time
+        response = client.post("/predict",
+                               json={"timestamp": "2016-03-03T15:07:00Z",
+                                     "region": 2})
+        assert response.status_code == 200
+        assert response.json()["timestamp"] == "2016-03-03T10:15:00"
+
+
+def test_predict_endpoint_rejects_locations_outside_the_box(root_path):
+    with TestClient(create_app(root_path, params)) as client:
+        for latitude, longitude in [(40.55, -73.98), (40.75, -73.60)]:
+            response = client.post("/predict",
+                                   json={"timestamp": "2016-03-03T10:07:00",
+                                         "latitude": latitude,
+                                         "longitude": longitude})
+            assert response.status_code == 422
+            assert "[40.6, 40.85]" in response.text
+            assert "[-74.05, -73.7]" in response.text
+
+        # the bounds themselves are served
+        response = client.post("/predict",
+                               json={"timestamp": "2016-03-03T10:07:00",
+                                     "latitude": 40.60, "longitude": -73.70})
+        assert response.status_code == 200
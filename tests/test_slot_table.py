@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from src.features.slot_table import (build_slot_table, slot_rows,
+                                     gather_rows, table_slots)
+
+
+# shuffled long table where region 1 misses its first day
+rng = np.random.default_rng(0)
+index = pd.date_range("2016-03-01", periods=3 * 96, freq="15min")
+frames = [pd.DataFrame(
+    {"region": region,
+     "lag_1": rng.integers(10, 200, len(index)).astype(float),
+     "day_of_week": index.day_of_week},
+    index=pd.DatetimeIndex(index, name="tpep_pickup_datetime"))
+    for region in range(3)]
+frames[1] = frames[1][96:]
+df = pd.concat(frames).sample(frac=1, random_state=0)
+table = build_slot_table(df)
+
+
+def test_slot_rows_match_loc():
+    for timestamp in [index[5], index[100], index[-1]]:
+        expected = df.loc[timestamp].sort_values("region")
+        regions, columns = slot_rows(table, timestamp)
+        np.testing.assert_array_equal(regions,
+                                      expected["region"].to_numpy())
+        for column in df.columns:
+            np.testing.assert_array_equal(columns[column],
+                                          expected[column].to_numpy())
+
+
+def test_full_slots_are_views():
+    _, columns = slot_rows(table, index[100])
+    assert np.shares_memory(columns["lag_1"], table["values"])
+    assert columns["lag_1"].flags.c_contiguous
+
+
+def test_slots_outside_the_table():
+    assert slot_rows(table, pd.Timestamp("2016-02-01")) is None
+    assert slot_rows(table, index[3] + pd.Timedelta("1min")) is None
+    timestamps = np.array([index[0], index[-1] + pd.Timedelta("15min")],
+                          dtype="datetime64[ns]")
+    slots = table_slots(table, timestamps)
+    np.testing.assert_array_equal(slots, [0, -1])
+
+
+def test_gather_rows():
+    columns = gather_rows(table, np.array([100, 200]), np.array([2, 1]))
+    expected = [df.loc[index[slot]].set_index("region").loc[region, "lag_1"]
+                for slot, region in [(100, 2), (200, 1)]]
+    np.testing.assert_array_equal(columns["lag_1"], expected)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from src.features.feature_store import save_features
+from src.models.train import train_model, train_model_from_file
+from src.models.sparse_linear import design_matrix
+
+
+@pytest.fixture(scope="module")
+def train_data(lag_feature_data):
+    # lag features of random pickups in a few regions over two weeks
+    return lag_feature_data("2016-01-01", 14, range(5))
+
+
+def test_design_matrix_matches_encoder(train_data):
+    encoder, _ = train_model(train_data, solver="dense")
+    X = train_data.drop(columns=["total_pickups"])
+    np.testing.assert_array_equal(design_matrix(X, encoder).toarray(),
+                                  encoder.transform(X).to_numpy())
+
+
+def test_normal_equations_match_dense_fit(train_data):
+    encoder, dense_model = train_model(train_data, solver="dense")
+    _, model = train_model(train_data, solver="normal_equations",
+                           chunksize=1000)
+    X_encoded = encoder.transform(train_data.drop(columns=["total_pickups"]))
+    np.testing.assert_allclose(model.predict(X_encoded),
+                               dense_model.predict(X_encoded),
+                               rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize("suffix", [".feather", ".parquet"])
+def test_training_from_file_chunks(train_data, tmp_path, suffix):
+    data_path = tmp_path / f"train{suffix}"
+    save_features(train_data, data_path)
+    encoder, dense_model = train_model(train_data, solver="dense")
+    file_encoder, model = train_model_from_file(data_path, chunksize=700)
+    X = train_data.drop(columns=["total_pickups"])
+    assert (list(file_encoder.get_feature_names_out()) ==
+            list(encoder.get_feature_names_out()))
+    np.testing.assert_allclose(model.predict(file_encoder.transform(X)),
+                               dense_model.predict(encoder.transform(X)),
+                               rtol=1e-6, atol=1e-6)
+
+
+def test_training_falls_back_to_the_csv_table(train_data, tmp_path):
+    # trees whose dvc.lock still tracks train.csv have no feather table
+    data_path = tmp_path / "train.feather"
+    save_features(train_data, data_path, export_csv=True)
+    data_path.unlink()
+    encoder, dense_model = train_model(train_data, solver="dense")
+    file_encoder, model = train_model_from_file(data_path, chunksize=700)
+    X = train_data.drop(columns=["total_pickups"])
+    np.testing.assert_allclose(model.predict(file_encoder.transform(X)),
+                               dense_model.predict(encoder.transform(X)),
+                               rtol=1e-6, atol=1e-6)
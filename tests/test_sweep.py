@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_percentage_error
+from src.features.extract_features import (write_cluster_cache,
+                                           extract_features)
+from src.features.feature_processing import process_features
+from src.models.train import train_model
+from src.models.sweep import sweep
+
+
+params = {"extract_features": {"mini_batch_kmeans": {"n_clusters": 4,
+                                                     "n_init": 3,
+                                                     "random_state": 42},
+                               "region_assignment": {"chunksize": 5000,
+                                                     "n_jobs": 1},
+                               "ewma": {"alpha": 0.4}},
+          "feature_processing": {"train_months": [1], "test_months": [2],
+                                 "features": {"lags": [1, 2, 3, 4],
+                                              "rolling_windows": [],
+                                              "weekly_lag": False}},
+          "train": {"solver": "normal_equations", "chunksize": 100000},
+          "region_grid": {"cell_size": 0.005}}
+
+
+def write_cache(cache_dir):
+    # pickups of january and february inside the inlier box
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2016-01-01").value
+    times = rng.integers(start, pd.Timestamp("2016-03-01").value, 40000)
+    times = times.astype("datetime64[ns]")
+    chunk = pd.DataFrame({
+        "tpep_pickup_datetime": times,
+        "pickup_longitude": rng.uniform(-74.05, -73.70, len(times)),
+        "pickup_latitude": rng.uniform(40.60, 40.85, len(times))})
+    write_cluster_cache([chunk], cache_dir)
+
+
+def test_sweep_matches_the_pipeline(tmp_path):
+    write_cache(tmp_path)
+    results = sweep(tmp_path, params, n_clusters_grid=[3, 4],
+                    alpha_grid=[0.3, 0.4], n_jobs=2)
+    assert len(results) == 4
+    assert results["MAPE"].is_monotonic_increasing
+    assert {"cluster_seconds", "cluster_peak_rss_mb", "seconds",
+            "peak_rss_mb"} <= set(results.columns)
+    # the alphas of one n_clusters share its counts
+    cluster_seconds = results.groupby("n_clusters")["cluster_seconds"]
+    assert (cluster_seconds.nunique() == 1).all()
+
+    # the stages of the dvc pipeline give the same loss for the configured
+    # point
+    _, _, _, resampled_data, _ = extract_features(tmp_path, params)
+    trainset, testset = process_features(resampled_data, params)
+    encoder, model = train_model(trainset, **params["train"])
+    X_test = encoder.transform(testset.drop(columns=["total_pickups"]))
+    y_pred = model.predict(X_test)
+    expected = mean_absolute_percentage_error(testset["total_pickups"],
+                                              y_pred)
+    row = results.loc[(results["n_clusters"] == 4) & (results["alpha"] == 0.4)]
+    np.testing.assert_allclose(row["MAPE"].item(), expected, rtol=1e-9)
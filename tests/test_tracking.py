@@ -0,0 +1,65 @@
+import pytest
+from pathlib import Path
+from src.models import tracking
+
+
+mlflow = pytest.importorskip("mlflow")
+
+
+def test_background_run_logs_to_the_local_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracking, "local_store", tmp_path / "mlruns")
+    monkeypatch.delenv("TRACKING_BACKEND", raising=False)
+    tracking.init_tracking()
+    assert mlflow.get_tracking_uri() == (tmp_path / "mlruns").as_uri()
+
+    experiment = mlflow.set_experiment("test")
+    run = tracking.BackgroundRun(mlflow, experiment.experiment_id,
+                                 run_name="model")
+    run.submit(mlflow.log_param, "alpha", 0.4)
+    for step in range(3):
+        run.submit(mlflow.log_metric, "MAPE", 0.1 / (step + 1), step=step)
+    run.close()
+
+    logged = mlflow.MlflowClient().get_run(run.run_id)
+    assert logged.info.status == "FINISHED"
+    assert logged.data.params == {"alpha": "0.4"}
+    history = mlflow.MlflowClient().get_metric_history(run.run_id, "MAPE")
+    assert [metric.value for metric in history] == [0.1, 0.05, 0.1 / 3]
+
+
+def test_failed_calls_are_raised_on_close(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracking, "local_store", tmp_path / "mlruns")
+    tracking.init_tracking("local")
+    experiment = mlflow.set_experiment("test")
+    run = tracking.BackgroundRun(mlflow, experiment.experiment_id)
+    run.submit(mlflow.log_metric, "MAPE", "not a number")
+    with pytest.raises(Exception):
+        run.close()
+
+
+def test_sync_registers_the_model_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracking, "local_store", tmp_path / "mlruns")
+    tracking.init_tracking("local")
+    mlflow.set_experiment("DVC Pipeline")
+    with mlflow.start_run() as run:
+        mlflow.log_text("model", "demand_prediction/model.txt")
+    client = mlflow.MlflowClient()
+    client.create_registered_model("model")
+    version = client.create_model_version(
+        "model", f"{run.info.artifact_uri}/demand_prediction",
+        run_id=run.info.run_id)
+    client.transition_model_version_stage("model", version.version,
+                                          "Staging")
+
+    # a second file store stands in for the remote server
+    remote_uri = (tmp_path / "remote").as_uri()
+    monkeypatch.setattr(tracking, "init_tracking",
+                        lambda backend: mlflow.set_tracking_uri(remote_uri))
+    synced = tracking.sync_runs("DVC Pipeline")
+    remote = mlflow.MlflowClient(tracking_uri=remote_uri,
+                                 registry_uri=remote_uri)
+    [remote_version] = remote.get_latest_versions("model", ["Staging"])
+    assert remote_version.run_id == synced[run.info.run_id]
+    model_dir = remote.download_artifacts(remote_version.run_id,
+                                          "demand_prediction", tmp_path)
+    assert (Path(model_dir) / "model.txt").read_text() == "model"